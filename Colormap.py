@@ -53,6 +53,139 @@ FigureCanvas = mpl_backend.FigureCanvasQTAgg
 from matplotlib.figure import Figure
 from matplotlib.colors import Normalize, LogNorm
 
+from Constants import IMAGE_HISTOGRAM_BINS, HISTOGRAM_BLOCK, AUTO_CONTRAST
+
+def get_cmap(name, nbcolors):
+    """ matplotlib colormap `name` resampled to `nbcolors` entries """
+    try:
+        from matplotlib import colormaps
+        return colormaps[name].resampled(nbcolors)
+    except (ImportError, AttributeError):
+        from matplotlib import cm
+        return cm.get_cmap(name, nbcolors)
+
+class FrameHistogram(object):
+    """
+    Histogram of an image with a fixed number of bins, computed once per
+    frame. Pixels are binned by blocks so no full size temporary is made.
+
+    For live frames the bin edges are kept while the new frame fits in
+    them (and spans at least half of them): min, max and counts are then
+    obtained in a single pass over the data.
+    """
+
+    def __init__(self, nbins=IMAGE_HISTOGRAM_BINS):
+        self.nbins = nbins
+        self.data = None
+        self.generation = None
+        self.counts = None
+        self.edges = None
+        self.min = np.nan
+        self.max = np.nan
+
+    def update(self, data, generation=None):
+        """
+        Histograms data. Nothing is done if data and generation are those of
+        the last frame seen (a frame refilled in place comes with a new
+        generation). Without a generation data is always histogrammed
+        """
+        if generation is not None and generation == self.generation and data is self.data:
+            return
+
+        self.data = data
+        self.generation = generation
+        flat = np.asarray(data).reshape(-1)
+
+        counts = None
+        if self.edges is not None:
+            lo, hi = self.edges[0], self.edges[-1]
+            counts, dmin, dmax = self._scan(flat, lo, hi)
+            if counts is not None and (dmax - dmin) * 2 < (hi - lo):
+                counts = None
+        else:
+            counts, dmin, dmax = self._scan(flat)
+
+        if not np.isfinite(dmin):
+            self.counts = self.edges = None
+            self.min = self.max = np.nan
+            return
+
+        if counts is None:
+            counts = self._scan(flat, dmin, dmax)[0]
+            self.edges = np.linspace(dmin, dmax, self.nbins + 1)
+
+        self.counts = counts
+        self.min, self.max = dmin, dmax
+
+    def _scan(self, flat, lo=None, hi=None):
+        """
+        Returns counts in the bins between lo and hi, min and max of the
+        finite values. Counts are None if no range is given or values fall
+        outside of it
+        """
+        nbins = self.nbins
+        counts = None
+        if lo is not None:
+            counts = np.zeros(nbins, dtype=np.int64)
+            scale = nbins / float(hi - lo) if hi > lo else 0.0
+
+        dmin, dmax = np.inf, -np.inf
+        isfloat = flat.dtype.kind == 'f'
+
+        for beg in range(0, flat.size, HISTOGRAM_BLOCK):
+            block = flat[beg:beg + HISTOGRAM_BLOCK]
+            if isfloat:
+                block = block[np.isfinite(block)]
+            if block.size == 0:
+                continue
+
+            bmin, bmax = block.min(), block.max()
+            dmin, dmax = min(dmin, bmin), max(dmax, bmax)
+
+            if counts is None:
+                continue
+            if bmin < lo or bmax > hi:
+                counts = None
+                continue
+
+            idx = ((block - lo) * scale).astype(np.intp)
+            np.minimum(idx, nbins - 1, out=idx)
+            counts += np.bincount(idx, minlength=nbins)
+
+        return counts, dmin, dmax
+
+    def percentile(self, pct):
+        """ Value below which pct % of the pixels are. None if no pixels """
+        if self.counts is None:
+            return None
+
+        cumul = np.cumsum(self.counts)
+        total = cumul[-1]
+        if total == 0:
+            return None
+
+        target = total * pct / 100.0
+        idx = min(int(np.searchsorted(cumul, target)), self.nbins - 1)
+        before = cumul[idx - 1] if idx > 0 else 0
+        inbin = self.counts[idx]
+        frac = (target - before) / float(inbin) if inbin else 0.0
+
+        return self.edges[idx] + frac * (self.edges[idx + 1] - self.edges[idx])
+
+    def limits(self, low_pct, high_pct):
+        """ Values at the given percentiles. None if they do not make a range """
+        low, high = self.percentile(low_pct), self.percentile(high_pct)
+        if low is None or high is None or not low < high:
+            return None
+        return (low, high)
+
+    def rebinned(self, nbins):
+        """ Counts and edges merged into (about) nbins bins, for display """
+        factor = max(self.nbins // nbins, 1)
+        if factor == 1 or self.nbins % factor:
+            return self.counts, self.edges
+        return self.counts.reshape(-1, factor).sum(axis=1), self.edges[::factor]
+
 class Colormap(QObject):
 
     default_cmap = 'hot'
@@ -63,6 +196,9 @@ class Colormap(QObject):
                         "nipy_spectral","gist_rainbow", "gist_ncar",
                         ]
 
+    # entries in the lookup table used to colorize images (256 or 4096)
+    default_lut_size = 256
+
     colormapChanged = pyqtSignal()
 
     def __init__(self, **values):
@@ -84,6 +220,20 @@ class Colormap(QObject):
         self._range = (_min_value, _max_value)
         self._autoscale = values.get('autoscale', True)
         self._logarithmic = values.get('logarithmic', False)
+        self._lut_size = values.get('lut_size', self.default_lut_size)
+
+        # autoscale limits taken at these percentiles of the image histogram
+        self._percentiles = values.get('percentiles', AUTO_CONTRAST)
+        self._histogram = None
+
+        # lookup table and last quantized image
+        self._lut = None
+        self._lut_key = None
+        self._qdata = None
+        self._qgen = None
+        self._qkey = None
+        self._qindex = None
+        self._qnan = None
 
         if self._autoscale is False:
             if None in self._limits: 
@@ -147,6 +297,30 @@ class Colormap(QObject):
             if self._autoscale:
                 self._update_norm()
 
+    @property
+    def histogram(self):
+        return self._histogram
+
+    @histogram.setter
+    def histogram(self, histogram):
+        # a FrameHistogram for the current frame. Gives datarange and,
+        # when autoscaling, the percentile limits
+        self._histogram = histogram
+        self._range = (histogram.min, histogram.max)
+        if self._autoscale:
+            self._update_norm()
+
+    @property
+    def percentiles(self):
+        return self._percentiles
+
+    @percentiles.setter
+    def percentiles(self, percentiles):
+        if percentiles != self._percentiles:
+            self._percentiles = percentiles
+            if self._autoscale:
+                self._update_norm()
+
     @property
     def limits(self):
         return self._limits
@@ -164,9 +338,88 @@ class Colormap(QObject):
     def norm(self):
         return self._norm
 
+    @property
+    def lut_size(self):
+        return self._lut_size
+
+    @lut_size.setter
+    def lut_size(self, lut_size):
+        if lut_size != self._lut_size:
+            self._lut_size = lut_size
+            self._changed()
+
+    def lut(self):
+        """ RGBA lookup table (uint8) for the current colormap """
+        key = (self._colormap, self._lut_size)
+        if key != self._lut_key:
+            cmap = get_cmap(self._colormap, self._lut_size)
+            self._lut = cmap(np.arange(self._lut_size), bytes=True)
+            self._lut_key = key
+        return self._lut
+
+    def quantize(self, data):
+        """
+        Returns the data as indexes in the lookup table. Values are clipped to
+        the colormap limits and scaled as Normalize/LogNorm would do
+        """
+        nmin, nmax = self._limits
+        if nmin is None or nmax is None:
+            nmin, nmax = np.nanmin(data), np.nanmax(data)
+        nmin, nmax = float(nmin), float(nmax)
+
+        nbcolors = self._lut_size
+
+        work = np.array(data, dtype=np.float32)
+        np.clip(work, nmin, nmax, out=work)
+
+        if self._logarithmic and (nmin > 0) and (nmax > 0):
+            np.log(work, out=work)
+            nmin, nmax = np.log(nmin), np.log(nmax)
+
+        work -= nmin
+        if nmax > nmin:
+            work *= nbcolors / (nmax - nmin)
+        np.minimum(work, nbcolors - 1, out=work)
+        np.nan_to_num(work, copy=False)
+
+        if nbcolors <= 256:
+            return work.astype(np.uint8)
+        return work.astype(np.uint16)
+
+    def to_rgba(self, data, generation=None):
+        """
+        Colorizes data through the lookup table. nan pixels are transparent.
+
+        generation identifies the content of data (live frames may be
+        refilled in place in the same array). The quantized image is kept
+        while data, generation and the colormap limits are the same.
+        Without a generation data is quantized at each call
+        """
+        key = (self._limits, self._logarithmic, self._lut_size)
+        newdata = generation is None or generation != self._qgen or data is not self._qdata
+        if newdata:
+            self._qnan = None
+            if np.asarray(data).dtype.kind == 'f':
+                nanmask = np.isnan(data)
+                if nanmask.any():
+                    self._qnan = nanmask
+        if newdata or key != self._qkey:
+            self._qindex = self.quantize(data)
+            self._qdata = data
+            self._qgen = generation
+            self._qkey = key
+
+        rgba = np.take(self.lut(), self._qindex, axis=0)
+        if self._qnan is not None:
+            rgba[self._qnan, 3] = 0
+        return rgba
+
     def _update_norm(self):
         if self._autoscale:
-            self._limits = tuple(self._range)
+            limits = None
+            if self._percentiles and self._histogram is not None:
+                limits = self._histogram.limits(*self._percentiles)
+            self._limits = limits or tuple(self._range)
 
         nmin, nmax = self._limits
 
@@ -184,6 +437,9 @@ class Colormap(QObject):
         self._autoscale = colormap.autoscale
         self._cmaplist = colormap.cmaplist
         self._logarithmic = colormap.logarithmic
+        self._lut_size = colormap.lut_size
+        self._percentiles = colormap.percentiles
+        self._histogram = colormap.histogram
         self._update_norm()
 
     def update(self, autoscale=None, limits=None, datarange=None, colormap=None):
@@ -215,11 +471,11 @@ class Colormap(QObject):
 
 class ColormapDialog(QDialog):
 
-    def __init__(self,colormap,parent=None,data=None,*args):
+    def __init__(self,colormap,parent=None,data=None,histogram=None,*args):
 
         super(ColormapDialog, self).__init__(parent,*args)
 
-        self.data = data
+        self.set_data(data, histogram)
         self._lmin, self._lmax = [None,None]
 
         self.setModal(False)
@@ -268,12 +524,16 @@ class ColormapDialog(QDialog):
         self.show_cbar_cb = QCheckBox("Show colorbar")
         self.autoscale_cb = QCheckBox("Autoscale")
         self.logarithmic_cb = QCheckBox("Logarithmic")
+        self.contrast_cb = QCheckBox("Auto contrast")
+        self.contrast_cb.setToolTip("Autoscale to the %g%% - %g%% percentiles" % AUTO_CONTRAST)
 
         self.autoscale_cb.toggled.connect(self.autoscale_changed)
         # self.cb_layout.addWidget(self.show_cbar_cb)
         self.cb_layout.addWidget(self.autoscale_cb)
         self.logarithmic_cb.toggled.connect(self.logarithmic_changed)
         self.cb_layout.addWidget(self.logarithmic_cb)
+        self.contrast_cb.toggled.connect(self.contrast_changed)
+        self.cb_layout.addWidget(self.contrast_cb)
 
         self.button_layout = QHBoxLayout()
         self.reset_button = QPushButton("Reset")
@@ -300,8 +560,13 @@ class ColormapDialog(QDialog):
         layout.addLayout(self.button_layout)
         self.setLayout(layout)
 
-    def set_data(self,data):
+    def set_data(self,data, histogram=None):
+        # FrameHistogram of data, computed here if not given
+        if histogram is None and data is not None:
+            histogram = FrameHistogram()
+            histogram.update(data)
         self.data = data
+        self.histogram = histogram
 
     def set_colormap(self, colormap):
         self.cmap = colormap
@@ -389,7 +654,12 @@ class ColormapDialog(QDialog):
         if self.block_update:
             return
 
+        self.block_update = True
         self.autoscale_cb.setChecked(self.cmap.autoscale)
+        self.logarithmic_cb.setChecked(self.cmap.logarithmic)
+        self.contrast_cb.setChecked(bool(self.cmap.percentiles))
+        self.block_update = False
+
         self.update_cmap_canvas()
         self.update_graph_canvas()
 
@@ -405,6 +675,12 @@ class ColormapDialog(QDialog):
 
         self.cmap.logarithmic=self.logarithmic_cb.isChecked()
 
+    def contrast_changed(self):
+        if self.block_update:
+            return
+
+        self.cmap.percentiles = self.contrast_cb.isChecked() and AUTO_CONTRAST or None
+
     def reset_cmap(self):
         self.cmap.copy_from(self.cmap_backup)
 
@@ -420,9 +696,11 @@ class ColormapDialog(QDialog):
             dmin, dmax = self.cmap.datarange
             stp = (dmax-dmin) / 250.0 # make 300 points 
             self.cmap_data = np.tile( np.arange(dmin, dmax, stp), (30,1))
-
-        self.im = self.cmap_ax.imshow(self.cmap_data, cmap=self.cmap.colormap, \
-                 norm=self.cmap.norm,interpolation='nearest')
+            self.im = self.cmap_ax.imshow(self.cmap_data, cmap=self.cmap.colormap, \
+                     norm=self.cmap.norm,interpolation='nearest')
+        else:
+            self.im.set_cmap(self.cmap.colormap)
+            self.im.set_norm(self.cmap.norm)
 
         self.cmap_ax.set_aspect("auto")
         if not self.cmap_init:
@@ -449,14 +727,10 @@ class ColormapDialog(QDialog):
         self.graph_ax.scatter(lmax,1,marker='<', color='red', alpha=1)
         self.graph_ax.plot(xe,ye, color='#707070')
 
-        if self.data is not None:
-            nbins = 50
-            rvl = self.data.ravel() # flatten values
-            nhist = np.histogram(rvl,bins=nbins)[0]
-            weights=np.ones(len(rvl))/nhist.max()
-            self.graph_ax.hist(rvl, bins=nbins, weights=weights, fc='#6666cc')
-            #self.hist_ax.hist(rvl, bins=nbins, weights=weights, range=(data.min(), data.max()), fc='#6666cc', ec='#6666cc')
-            #self.graph_ax.hist(self.data.ravel()/self.data.max(), bins=100, range=(self.data.min(), self.data.max()), fc='#9999cc')
+        if self.histogram is not None and self.histogram.counts is not None:
+            counts, edges = self.histogram.rebinned(64)
+            weights = counts / float(max(counts.max(), 1))
+            self.graph_ax.hist(edges[:-1], bins=edges, weights=weights, fc='#6666cc')
 
         midpos = dmin + valrange/2.9
         ecart = valrange/10.0
@@ -42,6 +42,9 @@ WATCHDOG_INTERVAL = 500  # time to check for parent pid running
 PENDING_INTERVAL = 30  # time to check for pending graphics requests
 PENDING_INTERVAL_INACTIVE = 400  # time to check for pending graphics requests on inactive sources
 UPDATEFILE_INTERVAL = 1000  # time to check whether an opened file has been modified
+UPDATEFILE_INTERVAL_WATCHED = 5000  # same, when the file system notifies modifications
+INDEX_POLL_INTERVAL = 200  # time to add scans found by the background file indexer to the scan tree
+OVERLAY_POLL_INTERVAL = 50  # time to add curves of selected scans loaded in background
 # time to check for data modified if scan is idle (shared mem mode)
 UPDATE_IDLE = 200
 # time to check for data modified if if scan is active (shared mem mode)
@@ -50,6 +53,17 @@ UPDATE_ACTIVE = 50
 UPDATE_SERVER = 5 
 UPDATE_VARIABLE = 1000  # time to check for data modified when following a spec variable
 
+# up to this number of points, new scan points are read from spec shared memory
+# row by row. above it the array is read at once and sliced
+SHM_ROW_READ_MAX = 16
+
+# mesh motor positions closer than this fraction of the mesh step are
+# considered the same grid column/row (absorbs motor position jitter)
+MESH_TOLERANCE = 0.1
+# largest motor jitter (in motor units) absorbed when binning mesh positions.
+# the jitter itself is estimated from the positions
+MESH_RESOLUTION = 0.005
+
 """
 DataType constants.  Can be
    DATA_STATIC:  Data is fixed in time. It will not change
@@ -72,6 +86,37 @@ DATA_FILE = 4
 
 DATA_SCAN = 0
 DATA_MCA = 1
+
+# initial number of rows allocated for DataBlock point buffers
+BUFFER_MIN_ROWS = 64
+
+# default memory budget (in MB) for parsed scans kept by file sources
+SCAN_CACHE_MB = 256
+
+# memory budget (in MB) for decoded frames of HDF5 image stacks
+FRAME_CACHE_MB = 512
+# frames read in advance on each side of the frame shown
+FRAME_PREFETCH = 2
+# time to show frames read in background
+FRAME_POLL_INTERVAL = 50
+# threads decoding image files
+IMAGE_LOADER_WORKERS = 2
+# bins of the histogram kept for each image (auto-contrast, colormap dialog)
+IMAGE_HISTOGRAM_BINS = 1024
+# pixels binned at once when histogramming a frame
+HISTOGRAM_BLOCK = 1024 * 1024
+# percentiles of the histogram used as colormap limits when autoscaling
+AUTO_CONTRAST = (0.5, 99.5)
+
+# maximum number of threads loading scans selected for overlay
+OVERLAY_MAX_WORKERS = 4
+
+# curves with more points than this (and than 4 per pixel) are decimated before plotting
+LOD_MIN_POINTS = 4096
+
+# images with more pixels than this are drawn from a multi-resolution pyramid,
+# cropped to the part in view
+PYRAMID_MIN_PIXELS = 1024 * 1024
 # 
 #
 # Events emitted by DataBlock
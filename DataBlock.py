@@ -45,6 +45,7 @@ from Features import haveFeature
 import numpy as np
 import DataStatistics
 import copy
+import zlib
 
 class DataBlock(DataObservable):
 
@@ -52,8 +53,17 @@ class DataBlock(DataObservable):
 
         super(DataBlock,self).__init__()
 
-        # data
-        self.data = np.empty((0))
+        # data. rows are kept in a preallocated buffer that grows by
+        # doubling its capacity; self.data is a view on the filled rows
+        self._buffer = None
+        self._nrows = 0
+        self._data_generation = 0
+        # changes when rows are not only appended to the buffer (new array, reset)
+        self._buffer_origin = 0
+        self._resetBuffer(0)
+
+        # last data checked for changes: [array, generation, origin, shape, dtype, crc]
+        self._fingerprint = [None, -1, -1, (), '', None]
 
         self.fulldata = self.data
 
@@ -100,6 +110,9 @@ class DataBlock(DataObservable):
         self.active_column = None
         self._current_stats = None
 
+        # running statistics for live data. keyed by (xcolumn, column)
+        self._running_stats = {}
+
         self.update(data, columnnames, metadata)
 
     # Description
@@ -144,7 +157,7 @@ class DataBlock(DataObservable):
             return self.getDataColumnByNumber(colno)
         else:  # return point no.
             nblines, nbcols = self.shape()
-            return np.array(range(nblines))
+            return np.arange(nblines)
 
     def getXYDataForColumn(self, column):
         if column in self.colnames: 
@@ -205,7 +218,7 @@ class DataBlock(DataObservable):
         if len(self.x_selection) == 0:
             nblines, nbcols = self.shape()
             xcolname = "Point no."
-            xdata = np.array(range(nblines))
+            xdata = np.arange(nblines)
             ret.append([xcolname, xdata])
             if self.mode_2d:
                 ret.append([xcolname, xdata])
@@ -217,7 +230,8 @@ class DataBlock(DataObservable):
         return ret
 
     def getDataColumnByNumber(self, colno):
-        if self.hasData():
+        # returns a view on the column. no copy is made
+        if self.data.size:
             if len(self.data.shape) == 1:
                 cdata = np.array([self.data[colno], ])
             else:
@@ -236,16 +250,11 @@ class DataBlock(DataObservable):
 
         columns_changed=self._setColumnNames(columnnames)
 
-        olddata = copy.copy(self.data)
-
         self._setData(data)
 
         self._update_slice_info()
              
-        if not np.array_equal(olddata,self.data):
-             data_changed = True
-        else:
-             data_changed = False
+        data_changed = self._checkDataChanged()
 
         columns_matched = self._matchColumnsAndData()
 
@@ -271,14 +280,11 @@ class DataBlock(DataObservable):
             if data.any() == False:
                 self.resetData()
             else:
-                self.data = data
+                self._adoptBuffer(data)
         elif data:
-            self.data = np.array(data)
+            self._adoptBuffer(np.array(data))
         else:
-            self.data = np.empty((0, len(self.colnames)))
-
-        if len(self.data.shape) == 1:
-            self.data = np.reshape(self.data, (self.data.shape[0], 1))
+            self._resetBuffer()
 
         self.fulldata = self.data
         self.fullrange = self.getRange()
@@ -352,7 +358,7 @@ class DataBlock(DataObservable):
         return self.slices
 
     def resetData(self):
-        self.data = np.empty((0, len(self.colnames)))
+        self._resetBuffer()
         self.fulldata = self.data
         self.fullrange = self.getRange()
         self.purgeExtraData()
@@ -393,13 +399,115 @@ class DataBlock(DataObservable):
         self._updateStats()
 
     def _addPoint(self, point):
-        try:
-            self.data = np.vstack((self.data, point))  # adding to existing
-        except:
-            self.data = np.array(point)    # first point
-
+        self._appendRows(point)
+        self._checkDataChanged()
         self._update_slice_info()
 
+    def _resetBuffer(self, nbcols=None):
+        """ Empties data. The buffer allocation is kept if the number of columns did not change """
+        if nbcols is None:
+            nbcols = len(self.colnames)
+
+        if self._buffer is None or self._buffer.ndim != 2 or \
+                self._buffer.shape[1] != nbcols or not self._buffer.flags.writeable:
+            self._buffer = np.empty((BUFFER_MIN_ROWS, nbcols))
+
+        self._nrows = 0
+        self._data_generation += 1
+        self._buffer_origin += 1
+        self._running_stats = {}
+        self.data = self._buffer[:0]
+
+    def _adoptBuffer(self, data):
+        """ Uses the array data as row buffer without copying it """
+        if len(data.shape) == 1:
+            data = np.reshape(data, (data.shape[0], 1))
+
+        self._buffer = data
+        self._nrows = data.shape[0]
+        self._data_generation += 1
+        self._buffer_origin += 1
+        self._running_stats = {}
+        self.data = data
+
+    def _appendRows(self, rows):
+        """ 
+        Appends one point or a 2D block of points to the buffer. The buffer capacity
+        is doubled when full, so that appending is amortized O(1) per point.
+        """
+        rows = np.asarray(rows)
+
+        if rows.ndim == 1:
+            rows = np.reshape(rows, (1, rows.shape[0]))
+
+        nbrows, nbcols = rows.shape
+        if nbrows == 0:
+            return
+
+        buf = self._buffer
+        nrows = self._nrows
+
+        if buf.shape[1] != nbcols:
+            if nrows:
+                log.log(2, "number of columns changed (%d -> %d). restarting data" % (buf.shape[1], nbcols))
+            nrows = 0
+            buf = np.empty((max(BUFFER_MIN_ROWS, nbrows), nbcols), dtype=np.result_type(rows.dtype, float))
+
+        dtype = np.result_type(buf.dtype, rows.dtype)
+        needed = nrows + nbrows
+
+        if needed > buf.shape[0] or dtype != buf.dtype or not buf.flags.writeable:
+            capacity = max(BUFFER_MIN_ROWS, 2 * buf.shape[0], needed)
+            newbuf = np.empty((capacity, nbcols), dtype=dtype)
+            newbuf[:nrows] = buf[:nrows]
+            buf = newbuf
+
+        buf[nrows:needed] = rows
+
+        self._buffer = buf
+        self._nrows = needed
+        self._data_generation += 1
+
+        view = buf[:needed]
+
+        if self.reduced or self.rangeX:
+            # data is a reduced copy. keep adding new points to it
+            self.data = np.vstack((self.data, rows))
+        else:
+            self.data = view
+
+        self.fulldata = view
+
+    def _checkDataChanged(self):
+        """
+        Tells whether data changed since the last check without keeping a copy of it.
+        The fingerprint is made of the shape and dtype of the data and a running crc
+        over its rows. When rows were only appended to the same buffer, just the new
+        rows are hashed. A new array (even a longer one) is hashed as a whole.
+        """
+        data = self.data
+        fp_data, fp_generation, fp_origin, fp_shape, fp_dtype, fp_crc = self._fingerprint
+
+        if data is fp_data and self._data_generation == fp_generation:
+            return False
+
+        nrows = data.shape[0]
+        dtype = data.dtype.str
+
+        if fp_crc is not None and fp_origin == self._buffer_origin and \
+                dtype == fp_dtype and len(fp_shape) == 2 and \
+                data.shape[1:] == fp_shape[1:] and nrows > fp_shape[0]:
+            crc = zlib.crc32(np.ascontiguousarray(data[fp_shape[0]:]), fp_crc)
+            changed = True
+        else:
+            # same number of rows (or different layout). all rows must be looked at
+            crc = zlib.crc32(np.ascontiguousarray(data))
+            changed = (data.shape != fp_shape or dtype != fp_dtype or crc != fp_crc)
+
+        self._fingerprint = [data, self._data_generation, self._buffer_origin,
+                             data.shape, dtype, crc]
+        return changed
+
     def addPoints(self, points, point_indexes=None):
 
         if point_indexes is not None:
@@ -411,6 +519,10 @@ class DataBlock(DataObservable):
                     do_replace = True
 
             if do_replace:
+                if not self.data.flags.writeable:  # e.g. a shared memory snapshot
+                    self._adoptBuffer(self.data.copy())
+                    self.fulldata = self.data
+
                 toadd_points = []
                 for ptno in range(len(points)):
                     idx = point_indexes[ptno]
@@ -420,15 +532,18 @@ class DataBlock(DataObservable):
                     else:
                         toadd_points.append(point)
 
+                # rows rewritten in place. next check must hash all rows
+                self._data_generation += 1
+                self._fingerprint[5] = None
+                self._running_stats = {}
+
                 if toadd_points:
                     points = toadd_points
 
-        if points:
-            try:
-                self.data = np.vstack((self.data, points))  # adding to existing
-            except:
-                self.data = np.array(points)    # first point
+        if len(points):
+            self._appendRows(points)
 
+        self._checkDataChanged()
         self._update_slice_info()
 
         self.emit(DATA_CHANGED)
@@ -473,6 +588,7 @@ class DataBlock(DataObservable):
             if colnames != self.colnames:
                 columns_updated = True
                 self.colnames = colnames
+                self._running_stats = {}
 
             self.colnames = colnames
 
@@ -1164,15 +1280,26 @@ class DataBlock(DataObservable):
                      'peak_y': ypos }
             log.log(3," 2d stats:  %s" % stats )
         else:
-            if self.scanobj and self.scanobj.isMesh():
+            is_mesh = self.scanobj and self.scanobj.isMesh()
+
+            if is_mesh:
                 xcol, xdata, ycol, ydata = self.getXYDataSliceForColumn(colname)
             else:
                 xcol, xdata, ycol, ydata = self.getXYDataForColumn(colname)
     
             if ydata.shape[0]:
-                com = DataStatistics.calc_com(xdata, ydata)
-                peak = DataStatistics.calc_peak(xdata, ydata)
-                fwhm = DataStatistics.calc_fwhm(xdata, ydata)
+                if is_mesh or self.reduced or self.rangeX or colname not in self.colnames:
+                    com = DataStatistics.calc_com(xdata, ydata)
+                    peak = DataStatistics.calc_peak(xdata, ydata)
+                    fwhm = DataStatistics.calc_fwhm(xdata, ydata)
+                else:
+                    # data only grows by appending points. use running stats
+                    running = self._running_stats.get((xcol, colname))
+                    if running is None:
+                        running = DataStatistics.RunningStats()
+                        self._running_stats[(xcol, colname)] = running
+                    com, peak, fwhm = running.calc_all(xdata, ydata)
+
                 stats = {'2d': False, 'xcolumn': xcol, 'column': colname, 'com': com, 'peak': peak, 'fwhm': fwhm}
 
         return stats
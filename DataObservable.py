@@ -45,47 +45,122 @@ One class are implemented:
         subscribe( subscriber, eventid )
         emit(eventid)
 
+Subscribers are indexed by event id, so that emitting an event only goes
+through the callbacks registered for it.  In coalescing mode, repeated emits 
+of some events (DATA_CHANGED, STATS_UPDATED by default) within one turn of the
+Qt event loop are merged into a single delivery with the latest arguments.
+Pending merged events are delivered before any other event is emitted.
 """
 
 from collections import deque
-from weakref import ref, proxy
+from weakref import ref, WeakMethod
+
+from Constants import DATA_CHANGED, STATS_UPDATED
 
 class DataObservable(deque):
     def __init__(self):
         super(DataObservable,self).__init__()
 
+        # eventid -> list of [objref, eventid, callback weakmethod]
+        self._subscribers = {}
+
+        self._coalescing = False
+        self._coalesced_events = (DATA_CHANGED, STATS_UPDATED)
+        self._pending = {}
+        self._flush_scheduled = False
+
+        self.emit_counters = {'emitted': 0, 'delivered': 0, 'merged': 0}
+
+    def setCoalescing(self, flag, eventids=None):
+        '''In coalescing mode, emits of eventids are delivered once per event loop turn'''
+        if eventids is not None:
+            self._coalesced_events = tuple(eventids)
+
+        self._coalescing = flag
+
+        if not flag:
+            self.flush()
+
+    def getEmitCounters(self):
+        return dict(self.emit_counters)
+
     def emit (self, eventid, *args):
         '''Pass parameters to all observers and update states.'''
+        self.emit_counters['emitted'] += 1
+
+        if self._coalescing and eventid in self._coalesced_events:
+            if eventid in self._pending:
+                self.emit_counters['merged'] += 1
+            self._pending[eventid] = args
+            self._scheduleFlush()
+            return
+
+        # events queued before this one are delivered first. subscribers
+        # see them in the order they were emitted (e.g. data before NEW_SCAN)
+        if self._pending:
+            self.flush()
+
+        self._deliver(eventid, args)
+
+    def flush(self):
+        '''Delivers pending coalesced events'''
+        self._flush_scheduled = False
+
+        pending = self._pending
+        self._pending = {}
+
+        for eventid, args in pending.items():
+            self._deliver(eventid, args)
+
+    def _scheduleFlush(self):
+        if self._flush_scheduled:
+            return
+
+        try:
+            from pyspec.graphics.QVariant import QTimer
+        except ImportError:
+            # no event loop to wait for. deliver now
+            self.flush()
+            return
+
+        self._flush_scheduled = True
+        QTimer.singleShot(0, self.flush)
+
+    def _deliver(self, eventid, args):
         todel = []
-        for elem in self:
-            objref,eid,cbt,cbm = elem
+        for elem in self._subscribers.get(eventid, ()):
+            callb = elem[2]()
 
             # clean up queue if references has been deleted
-            if objref() is None:
+            if callb is None or elem[0]() is None:
                 todel.append(elem)
-            elif eid == eventid:
-                cbm(cbt,*args)
+            else:
+                self.emit_counters['delivered'] += 1
+                callb(*args)
 
         if len(todel):
             self.cleanup(todel)
   
     def subscribe(self, obj,eventid,callb):
         '''Add a new subscriber to self.'''
-        objref = ref(obj)
-        cb_target = proxy(callb.__self__)
-        cb_method = proxy(callb.__func__)
-        elem = [objref,eventid,cb_target, cb_method]  
-        if elem not in self:
-            self.append(elem)
+        subscribers = self._subscribers.setdefault(eventid, [])
+
+        for elem in subscribers:
+            if elem[0]() is obj and elem[2]() == callb:
+                return
+
+        elem = [ref(obj), eventid, WeakMethod(callb)]
+        subscribers.append(elem)
+        self.append(elem)
 
     def unsubscribe(self, subscriber, eventid=None):
         todel = []
         for elem in self: 
-            objref,evid,cbt,cbm = elem
+            objref,evid,cbm = elem
             obj = objref()
             if obj is None:
                 todel.append(elem)
-            elif obj() is subscriber:
+            elif obj is subscriber:
                 if eventid is None or eventid == evid:
                     todel.append(elem)
 
@@ -96,11 +171,14 @@ class DataObservable(deque):
         if objs is None:
             objlist = []
             for elem in self:
-                if elem[0]() is None:
+                if elem[0]() is None or elem[2]() is None:
                     objlist.append(elem)
         else:
             objlist = objs
 
         for obj in objlist:
-            self.remove(obj)
-  
+            if obj in self:
+                self.remove(obj)
+            subscribers = self._subscribers.get(obj[1])
+            if subscribers and obj in subscribers:
+                subscribers.remove(obj)
@@ -56,11 +56,9 @@ import icons
 import time
 
 try:
-    import hdf5plugin
-    import h5py
-    h5py_imported = True
+    import queue
 except ImportError:
-    h5py_imported = False
+    import Queue as queue
 
 try:
     import fabio
@@ -84,6 +82,9 @@ except:
     shm_available = False
 
 from OnzeWidget import OnzeWidget
+from HDF5Stack import FrameStack, FrameLoader, h5py_imported
+from ImageLoader import ImageLoader, image_files
+from ScanCache import ScanCache
 
 from Preferences import Preferences
 
@@ -116,6 +117,19 @@ class DataSource2D(DataSource):
         self.selected_data = None
         self.refresh_cnt = 0
 
+        # frame stacks (hdf5)
+        self.stack = None
+        self.frameloader = None
+        self.frameTimer = None
+        self.wanted_frame = None
+
+        # image files read in background (and directory browsing)
+        self.imageloader = None
+        self.loading_file = None
+        self.dir_files = []
+        self.dir_format = None
+        self.dir_cache = None
+
         sourcetype = SOURCE_2D
         DataSource.__init__(self, app, sourcetype, varname)
 
@@ -158,6 +172,19 @@ class DataSource2D(DataSource):
         self.top_layout.addWidget(self.display_label,1,0)
         self.top_layout.addWidget(self.display_value,1,1)
 
+        self.load_value = QLabel()
+        self.top_layout.addWidget(self.load_value,1,2)
+
+        self.frame_label = QLabel("Frame:")
+        self.frame_slider = QSlider(Qt.Horizontal)
+        self.frame_value = QLabel()
+        self.frame_slider.valueChanged.connect(self.frame_changed)
+
+        self.top_layout.addWidget(self.frame_label,2,0)
+        self.top_layout.addWidget(self.frame_slider,2,1)
+        self.top_layout.addWidget(self.frame_value,2,2)
+        self.show_frame_slider(False)
+
         self.top_widget.setLayout(self.top_layout)
         self.set_source_header_widget(self.top_widget)
         self.add_source_tab(1, self.info_widget,  "Info")
@@ -174,46 +201,203 @@ class DataSource2D(DataSource):
 
     def open_file(self,filename,imgformat):
 
-        data = None
+        if imgformat == 'HDF5' and not h5py_imported:
+            popupError(self, "open 2d data file", "cannot import h5py/ or hdf5plugin.",
+                    moremsg="hint: opening HDF5 files needs module h5py. Try  installing them:" 
+                            "    pip (or pip3) install hdf5plugin"
+                            "    pip (or pip3) install h5py")
+            return
+
         try:
-            if imgformat == 'TIFF':
-                from pyspec.file.tiff import TiffFile
-                data = TiffFile(filename).asarray()
-                self.setData(data)
-            elif imgformat == 'ITEX':
-                from pyspec.file.hamamatsu import ItexImage
-                log.log(2, "opening file %s" % filename)
-                data = ItexImage(filename).data
+            if os.path.isdir(filename):
+                self.open_directory(filename, imgformat)
             elif imgformat == 'HDF5':
-                if not h5py_imported:
-                    popupError(self, "open 2d data file", "cannot import h5py/ or hdf5plugin.",
-                            moremsg="hint: opening HDF5 files needs module h5py. Try  installing them:" 
-                                    "    pip (or pip3) install hdf5plugin"
-                                    "    pip (or pip3) install h5py")
-                else:
-                    try:
-                        f = h5py.File(filename)
-                        log.log(2,"hdf5 1")
-                        d = f['/entry/data/data_000001'][()]
-                        log.log(2, "hdf5 2 %s" % str(d.shape))
-                        data = d[0]
-                        log.log(2, "hdf5 3")
-                    except:
-                        import traceback
-                        log.log(3,traceback.format_exc())
-            elif fabio_imported:
-                img = fabio.open(filename)
-                data = img.data
+                self.open_stack(filename)
+            else:
+                # decoded in background. shown by image_loaded()
+                self.close_stack()
+                self.close_browse()
+                self.loading_file = filename
+                self.get_image_loader().load([filename], imgformat)
         except BaseException as e:
             import traceback
             popupError(self, "open 2d data file", "problem opening file %s - %s" % (filename, str(e)),
                            moremsg="hint: check that the selected format (%s)" % imgformat)
             log.log(3,traceback.format_exc())
+
+    def get_image_loader(self):
+        if self.imageloader is None:
+            self.imageloader = ImageLoader()
+            self.imageloader.imageLoaded.connect(self.image_loaded)
+            self.imageloader.loadFailed.connect(self.image_failed)
+            self.imageloader.progress.connect(self.load_progress)
+        return self.imageloader
+
+    def open_directory(self, dirname, imgformat):
+        # browse the images in a directory with the frame slider
+        filenames = image_files(dirname, imgformat)
+
+        if not filenames:
+            raise ValueError("no %s files found in %s" % (imgformat, dirname))
+
+        self.close_stack()
+        self.close_browse()
+
+        self.dir_files = filenames
+        self.dir_format = imgformat
+        self.dir_cache = ScanCache(FRAME_CACHE_MB * 1024 * 1024)
+        self.filename = dirname
+
+        self.set_frame_range(len(filenames))
+        self.frame_changed(0)
+
+    def close_browse(self):
+        if self.imageloader:
+            self.imageloader.cancel()
+
+        self.dir_files = []
+        self.dir_cache = None
+        self.loading_file = None
+
+    def browse_file(self, frameno, prefetch):
+        filename = self.dir_files[frameno]
+
+        record = self.dir_cache.get(filename)
+        if record is not None:
+            self.wanted_frame = None
+            self.show_image(record)
+
+        # files queued for previous positions and not needed anymore are dropped
+        wanted = [self.dir_files[idx] for idx in prefetch
+                      if 0 <= idx < len(self.dir_files) and self.dir_files[idx] not in self.dir_cache]
+
+        loader = self.get_image_loader()
+        loader.cancel(keep=wanted)
+        loader.load(wanted, self.dir_format)
+
+    def image_loaded(self, filename, record):
+        if self.dir_files:
+            self.dir_cache.put(filename, **record)
+            if self.wanted_frame is not None and filename == self.dir_files[self.wanted_frame]:
+                self.wanted_frame = None
+                self.show_image(record)
+        elif filename == self.loading_file:
+            self.loading_file = None
+            if record['data'].any():
+                self.filename = filename
+                self.show_image(record)
+
+    def image_failed(self, filename, error):
+        if self.dir_files and (self.wanted_frame is None or 
+                   filename != self.dir_files[self.wanted_frame]):
+            log.log(2, "cannot read %s - %s" % (filename, error))
             return
 
-        if data is not None and data.any():
-            self.filename = filename
-            self.setData(data)
+        popupError(self, "open 2d data file", "problem opening file %s - %s" % (filename, error),
+                       moremsg="hint: check that the selected format (%s)" % self.dir_format)
+
+    def load_progress(self, done, total):
+        if done < total:
+            self.load_value.setText("loading %d/%d" % (done+1, total))
+        else:
+            self.load_value.setText("")
+
+    def show_image(self, record):
+        self.setData(record['data'], stats=record)
+
+    def open_stack(self, filename):
+        # frames are read one chunk at a time and only when shown (or
+        # about to be shown)
+        self.close_stack()
+        self.close_browse()
+
+        self.stack = FrameStack(filename)
+        log.log(2, "hdf5 stack %s has %d frames" % (filename, len(self.stack)))
+
+        if len(self.stack) == 0:
+            raise ValueError("no image data found in %s" % filename)
+
+        self.filename = filename
+
+        self.frameloader = FrameLoader(self.stack)
+        self.frameloader.start()
+
+        self.frameTimer = QTimer()
+        self.frameTimer.timeout.connect(self._showLoadedFrame)
+        self.frameTimer.start(FRAME_POLL_INTERVAL)
+
+        self.set_frame_range(len(self.stack))
+        self.frame_changed(0)
+
+    def close_stack(self):
+        if self.frameTimer:
+            self.frameTimer.stop()
+            self.frameTimer = None
+
+        if self.frameloader:
+            self.frameloader.request_stop()
+            self.frameloader = None
+
+        if self.stack:
+            self.stack.close()
+            self.stack = None
+
+        self.wanted_frame = None
+        self.show_frame_slider(False)
+
+    def set_frame_range(self, nbframes):
+        self.frame_slider.blockSignals(True)
+        self.frame_slider.setRange(0, nbframes-1)
+        self.frame_slider.setValue(0)
+        self.frame_slider.blockSignals(False)
+        self.show_frame_slider(nbframes > 1)
+
+    def show_frame_slider(self, show):
+        self.frame_label.setVisible(show)
+        self.frame_slider.setVisible(show)
+        self.frame_value.setVisible(show)
+
+    def frame_changed(self, frameno):
+        self.wanted_frame = frameno
+
+        if self.stack:
+            nbframes = len(self.stack)
+        else:
+            nbframes = len(self.dir_files)
+
+        self.frame_value.setText("%d / %d" % (frameno+1, nbframes))
+
+        # then its neighbours, nearest first
+        prefetch = [frameno]
+        for offset in range(1, FRAME_PREFETCH+1):
+            prefetch.extend([frameno+offset, frameno-offset])
+
+        if not self.stack:
+            self.browse_file(frameno, prefetch)
+            return
+
+        frame = self.stack.get_frame(frameno)
+        if frame is not None:
+            self.show_frame(frameno, frame)
+
+        self.frameloader.request(prefetch)
+
+    def _showLoadedFrame(self):
+        try:
+            while True:
+                frameno = self.frameloader.loaded.get_nowait()
+                if frameno == self.wanted_frame:
+                    self.show_frame(frameno, self.stack.get_frame(frameno))
+        except queue.Empty:
+            pass
+
+    def show_frame(self, frameno, frame):
+        if frame is None:   # already evicted
+            self.frameloader.request([frameno])
+            return
+
+        self.wanted_frame = None
+        self.setData(frame)
 
     def set_connection(self, conn):
         self.spec_c = conn
@@ -223,10 +407,10 @@ class DataSource2D(DataSource):
         except:
             pass
 
-    def setData(self,data, metadata=None):
+    def setData(self,data, metadata=None, stats=None):
         self.data = data
         self.metadata = metadata
-        self.plot_w.setData(data, metadata) 
+        self.plot_w.setData(data, metadata, stats)
 
     def getData(self):
         return self.data
@@ -242,6 +426,7 @@ class DataSource2D(DataSource):
 
         if self.roi_dialog:
             self.roi_dialog.set_range(self.selection_info['info'])
+            self.roi_dialog.set_values(self.selection_info)
 
     def set_selection_mode(self):
         # for 2D default selection mode is "square
@@ -262,13 +447,16 @@ class DataSource2D(DataSource):
         fstats['nb pixels'] = width*height
         fstats['dtype'] = data.dtype
 
+        # full image values are computed once per frame
+        dsum, dmax, dmin, daver, dstd = self.plot_w.getRegionStats().calc_full()
+
         stats['statistics'] = OrderedDict()
         sstats = stats['statistics']
-        sstats['sum'] = "%3.6g" % data.sum()
-        sstats['max'] = "%3.6g" % data.max() 
-        sstats['min'] = "%3.6g" % data.min()
-        sstats['average'] = "%3.6g" % data.mean()
-        sstats['std dev'] = "%3.6g" % data.std()
+        sstats['sum'] = "%3.6g" % dsum
+        sstats['max'] = "%3.6g" % dmax
+        sstats['min'] = "%3.6g" % dmin
+        sstats['average'] = "%3.6g" % daver
+        sstats['std dev'] = "%3.6g" % dstd
 
         if self.selection_info is not None:
             if self.selection_info['coords']:
@@ -346,6 +534,13 @@ class DataSource2D(DataSource):
             elapsed = time.time()-t0
             log.log(2,"   updated in: %3.3f secs" % elapsed)
 
+    def close(self):
+        super(DataSource2D, self).close()
+        self.close_stack()
+        self.close_browse()
+        if self.imageloader:
+            self.imageloader.shutdown()
+
     def follow(self):
         if self.varname is None:
             return
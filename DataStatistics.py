@@ -40,6 +40,12 @@ This module implements several mathematical functions:
     - peak search
     - center of mass search
     - fwhm search
+
+The RunningStats class gives the same results for data that grows
+point by point (live scans) without going again through all points.
+
+The RegionStats class gives sum, average and std dev of rectangular
+regions of an image (or channel ranges of an mca) from summed-area tables.
 """
 from pyspec.css_logger import log
 
@@ -47,12 +53,14 @@ import numpy
 
 def calc_peak(xdata, ydata):
 
-    maxv = ydata.max()
+    if len(ydata.shape) > 1:
+        ydata = ydata[:,0]
+
+    # argmax gives the first position of the maximum (or of a nan)
+    imax = int(ydata.argmax())
+    maxv = ydata[imax]
 
     if not numpy.isnan(maxv):
-        if len(ydata.shape) > 1:
-            ydata = ydata[:,0]
-        imax = ydata.tolist().index(maxv)
         xmax = xdata[imax]
         return xmax, maxv, imax
     else:
@@ -84,6 +92,11 @@ def calc_fwhm(xdata, ydata):
 
     xpk,ypk,ipk = calc_peak(xdata,ydata)
 
+    return _fwhm_result(lhmx, uhmx, xpk)
+
+
+def _fwhm_result(lhmx, uhmx, xpk):
+
     fwhm = abs(uhmx - lhmx)
 
     if lhmx != xpk and uhmx != xpk:
@@ -172,32 +185,150 @@ def calc_hmx(xdata, ydata, direction):
 
     x0 = x1 = xdata[i]
 
-    half = y1 / 2
-    start = 0
+    i, x1, y1, hmx = _walk_hmx(xdata, ydata, i, direction, x1, y1, y1 / 2)
 
-    while True:
+    if hmx is None:  # we could not find half the height of max
+        return(x0)
 
-        if direction > 0 and i >= npts:  # we could not find half the height of max
-            return(x0)
+    return(hmx)
 
-        if direction < 0 and i < start:
-            return(x0)
 
-        # use value to avoid problems with unsigned numpy calculations
-        x = float(xdata[i])
-        y = float(ydata[i])
+def _walk_hmx(xdata, ydata, i, direction, x1, y1, half):
+    """
+    Walks from index i in direction until ydata falls to half.
+    Returns the walk state (i, x1, y1) and the interpolated position, 
+    which is None if the end of data was reached first. The walk can be
+    continued from the returned state if more data is added.
+
+    Points are compared in chunks of growing size, so that only the
+    points close to the crossing are looked at.
+    """
+    npts = len(ydata)
+    chunk = 64
+
+    while 0 <= i < npts:
+
+        if direction > 0:
+            seg = ydata[i:i + chunk]
+        else:
+            seg = ydata[max(i - chunk + 1, 0):i + 1][::-1]
+
+        below = seg <= half
+
+        if below.any():  # found it
+            k = int(below.argmax())
+            idx = i + direction * k
+
+            if k:
+                # use value to avoid problems with unsigned numpy calculations
+                x1 = float(xdata[idx - direction])
+                y1 = float(ydata[idx - direction])
+
+            x = float(xdata[idx])
+            y = float(ydata[idx])
 
-        if y <= half:  # found it
             dy = y1 - y
             if dy != 0:
                 x1 -= (x1 - x) * (y1 - half) / dy
 
-            return(x1)
+            return idx, x1, y1, x1
+
+        last = i + direction * (len(seg) - 1)
+        x1 = float(xdata[last])
+        y1 = float(ydata[last])
+
+        i = last + direction
+        chunk *= 2
+
+    return i, x1, y1, None
+
+
+def calc_all(xdata, ydata2d):
+    """
+    Calculates com, peak and fwhm for every column in ydata2d in one pass.
+    Returns a list with a (com, peak, fwhm) tuple for each column, with the
+    values calc_com, calc_peak and calc_fwhm give for that column.
+    """
+    ydata2d = numpy.asarray(ydata2d)
+
+    if len(ydata2d.shape) == 1:
+        ydata2d = ydata2d.reshape((ydata2d.shape[0], 1))
+
+    npts, ncols = ydata2d.shape
+
+    if npts == 0:
+        return []
+
+    xdata = numpy.asarray(xdata)
+    cols = numpy.arange(ncols)
+
+    # com
+    ysum = ydata2d.sum(axis=0)
+    xysum = (xdata[:, numpy.newaxis] * ydata2d).sum(axis=0)
 
-        x1 = x
-        y1 = y
+    # peak
+    imax = ydata2d.argmax(axis=0)
+    maxv = ydata2d[imax, cols]
+    half = maxv / 2
 
-        i += direction
+    # half maximum crossings. first point below half after the peak
+    # and last point below half before the peak
+    xf = xdata.astype(float)
+    yf = ydata2d.astype(float)
+
+    rows = numpy.arange(npts)[:, numpy.newaxis]
+    below = yf <= half
+
+    upper = below & (rows > imax)
+    lower = below & (rows < imax)
+
+    found_u = upper.any(axis=0)
+    found_l = lower.any(axis=0)
+
+    iu = upper.argmax(axis=0)
+    il = npts - 1 - lower[::-1].argmax(axis=0)
+
+    # the point before the crossing is only used if it is not the peak
+    pu = numpy.where(iu > imax + 1, iu - 1, iu)
+    pl = numpy.where(il < imax - 1, il + 1, il)
+
+    uhmx = _interpolate_hmx(xf, yf, iu, pu, cols, half)
+    lhmx = _interpolate_hmx(xf, yf, il, pl, cols, half)
+
+    # not found. neighbour of the peak, or first/last point if peak is at the edge
+    uhmx = numpy.where(found_u, uhmx, xf[numpy.minimum(imax + 1, npts - 1)])
+    lhmx = numpy.where(found_l, lhmx, xf[numpy.maximum(imax - 1, 0)])
+
+    results = []
+
+    for col in range(ncols):
+        if numpy.isnan(maxv[col]):
+            ydata = ydata2d[:, col]
+            results.append((calc_com(xdata, ydata), calc_peak(xdata, ydata), calc_fwhm(xdata, ydata)))
+            continue
+
+        com = xysum[col] / ysum[col] if ysum[col] else 0
+        ipk = int(imax[col])
+        peak = (xdata[ipk], maxv[col], ipk)
+        fwhm = _fwhm_result(lhmx[col], uhmx[col], xdata[ipk])
+
+        results.append((com, peak, fwhm))
+
+    return results
+
+
+def _interpolate_hmx(xf, yf, idx, pidx, cols, half):
+    x = xf[idx]
+    y = yf[idx, cols]
+    x1 = xf[pidx]
+    y1 = yf[pidx, cols]
+
+    dy = y1 - y
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        hmx = numpy.where(dy != 0, x1 - (x1 - x) * (y1 - half) / dy, x1)
+
+    return hmx
 
 
 def _calc_index(elem, array):
@@ -206,8 +337,281 @@ def _calc_index(elem, array):
     """
     if numpy.isnan(elem):
         return 0
-    mylist = array.tolist()
-    return mylist.index(elem)
+    return int((array == elem).argmax())
+
+
+class RunningStats(object):
+    """
+    Keeps com, peak and fwhm for a pair of x/y columns that grow by
+    appending points. Sums for com are accumulated, the peak is a running
+    maximum and the half maximum positions are searched only around the
+    peak, when it changes or when the upper side was not found yet.
+
+    Results are the same as those of calc_com, calc_peak and calc_fwhm
+    on the full columns (com up to floating point rounding of the sums).
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.npts = 0
+        self.ysum = 0
+        self.xysum = 0
+        self.has_nan = False
+
+        self.ymax = None
+        self.imax = -1
+
+        self.lhmx = None
+        self._upper = None   # walk state [i, x1, y1, x0, hmx]
+
+    def update(self, xdata, ydata):
+        """ Accounts for the points appended to xdata, ydata since last update """
+
+        npts = len(ydata)
+
+        if npts < self.npts:
+            self.reset()
+
+        if npts == self.npts:
+            return
+
+        newx = xdata[self.npts:]
+        newy = ydata[self.npts:]
+
+        self.ysum += newy.sum()
+        self.xysum += (newx * newy).sum()
+
+        maxv = newy.max()
+
+        if numpy.isnan(maxv):
+            self.has_nan = True
+        elif self.ymax is None or maxv > self.ymax:
+            self.ymax = maxv
+            self.imax = self.npts + int(newy.argmax())
+            self.lhmx = None
+            self._upper = None
+
+        self.npts = npts
+
+    def calc_com(self):
+        if self.ysum:
+            return self.xysum / self.ysum
+        return 0
+
+    def calc_peak(self, xdata):
+        if self.ymax is None:
+            return [0, ] * 3
+        return xdata[self.imax], self.ymax, self.imax
+
+    def calc_fwhm(self, xdata, ydata):
+        imax = self.imax
+
+        # lower side only depends on the points before the peak
+        if self.lhmx is None:
+            if imax == 0:
+                self.lhmx = xdata[0]
+            else:
+                x0 = xdata[imax - 1]
+                walk = _walk_hmx(xdata, ydata, imax - 1, -1, x0, self.ymax, self.ymax / 2)
+                self.lhmx = x0 if walk[3] is None else walk[3]
+
+        # upper side. continue search where it was left
+        if imax == self.npts - 1:
+            uhmx = xdata[-1]
+        else:
+            if self._upper is None:
+                x0 = xdata[imax + 1]
+                self._upper = [imax + 1, x0, self.ymax, x0, None]
+
+            i, x1, y1, x0, hmx = self._upper
+
+            if hmx is None:
+                i, x1, y1, hmx = _walk_hmx(xdata, ydata, i, 1, x1, y1, self.ymax / 2)
+                self._upper = [i, x1, y1, x0, hmx]
+
+            uhmx = x0 if hmx is None else hmx
+
+        return _fwhm_result(self.lhmx, uhmx, xdata[imax])
+
+    def calc_all(self, xdata, ydata):
+        """ Returns com, peak and fwhm after updating with new points in xdata, ydata """
+
+        self.update(xdata, ydata)
+
+        if self.has_nan:
+            # nan handling of the batch functions is kept as is
+            return calc_com(xdata, ydata), calc_peak(xdata, ydata), calc_fwhm(xdata, ydata)
+
+        return self.calc_com(), self.calc_peak(xdata), self.calc_fwhm(xdata, ydata)
+
+
+def check_running_stats(xdata, ydata, step=1):
+    """
+    Appends xdata, ydata to a RunningStats `step` points at a time and
+    compares its results with calc_all on the same points after each append.
+    Returns the numbers of points for which they differ.
+    """
+    running = RunningStats()
+    differ = []
+
+    for ptno in list(range(step, len(ydata), step)) + [len(ydata)]:
+        xpart, ypart = xdata[:ptno], ydata[:ptno]
+
+        rcom, rpeak, rfwhm = running.calc_all(xpart, ypart)
+        bcom, bpeak, bfwhm = calc_all(xpart, ypart)[0]
+
+        if not numpy.allclose(rcom, bcom, equal_nan=True) or \
+                not numpy.allclose(list(rpeak), list(bpeak), equal_nan=True) or \
+                not numpy.allclose(rfwhm, bfwhm, equal_nan=True):
+            differ.append(ptno)
+
+    return differ
+
+
+def _synthetic_scans():
+    """ Scans used to check running statistics without a spec server """
+    rand = numpy.random.RandomState(0)
+    xdata = numpy.linspace(-5, 5, 201)
+
+    gauss = 1000 * numpy.exp(-xdata**2)
+    yield "gaussian", xdata, gauss + rand.normal(0, 5, len(xdata))
+    yield "two peaks", xdata, gauss + 1500 * numpy.exp(-(xdata - 3)**2 * 4)
+    yield "counts", xdata, rand.poisson(gauss + 10).astype(float)
+    yield "decreasing x", xdata[::-1], gauss
+    yield "rising edge", xdata, numpy.arange(len(xdata), dtype=float)
+
+    with_nan = gauss.copy()
+    with_nan[120] = numpy.nan
+    yield "nan point", xdata, with_nan
+
+
+class RegionStats(object):
+    """
+    Statistics of rectangular regions of an image (or of channel ranges of
+    a 1D array). Summed-area tables of the values and of their squares are
+    built the first time a region is asked, and kept until release() (the
+    region selection is cleared). While they are there sum, average and
+    std dev of any region take four table lookups. Min and max are taken
+    on the region (a view, no copy).
+
+    Tables of 8 and 16 bit integer frames are exact int64 sums. Other
+    frames use float64 sums of the values taken relative to the mean.
+
+    Regions are given as in slicing: rows r0:r1, columns c0:c1. Statistics
+    of the full data do not use the tables.
+    """
+
+    # pixels converted at once when building the tables
+    block_pixels = 1024 * 1024
+
+    def __init__(self, data):
+        data = numpy.asarray(data)
+        if data.ndim == 1:
+            data = data[numpy.newaxis, :]
+
+        self.data = data
+        self.rows, self.cols = data.shape
+
+        # squares of wider integers could overflow int64 sums
+        self._exact = data.dtype.kind == 'b' or \
+                (data.dtype.kind in 'iu' and data.dtype.itemsize <= 2)
+
+        self._full = None
+        self.release()
+
+    def release(self):
+        """ Drops the tables. They are built again if a region is asked """
+        self._sat = None
+        self._sqsat = None
+        self._shift = 0.0
+        self._usable = None   # False if tables cannot be used (nan/inf values)
+
+    def _build(self):
+        if self._exact:
+            self._shift = 0
+            accum = numpy.int64
+        else:
+            # values are taken relative to the mean so that the sums of
+            # squares do not lose precision
+            self._shift = float(self.data.mean())
+            accum = numpy.float64
+
+            if not numpy.isfinite(self._shift):
+                # nan/inf would spread all over the tables. regions are sliced
+                return False
+
+        self._sat = self._table(accum)
+        self._sqsat = self._table(accum, square=True)
+        return True
+
+    def _table(self, accum, square=False):
+        # rows are converted by blocks. no full size temporary is made
+        table = numpy.zeros((self.rows + 1, self.cols + 1), dtype=accum)
+        sums = table[1:, 1:]
+        step = max(self.block_pixels // max(self.cols, 1), 1)
+
+        for beg in range(0, self.rows, step):
+            block = self.data[beg:beg + step].astype(accum)
+            if self._shift:
+                block -= self._shift
+            if square:
+                numpy.square(block, out=block)
+
+            numpy.cumsum(block, axis=0, out=sums[beg:beg + step])
+            if beg:
+                sums[beg:beg + step] += sums[beg - 1]
+
+        numpy.cumsum(sums, axis=1, out=sums)
+        return table
+
+    def _lookup(self, table, r0, r1, c0, c1):
+        return table[r1, c1] - table[r0, c1] - table[r1, c0] + table[r0, c0]
+
+    def calc_region(self, r0=0, r1=None, c0=0, c1=None):
+        """ Returns sum, max, min, average and std dev of a region (None if empty) """
+
+        r0, r1, _s = slice(r0, r1).indices(self.rows)
+        c0, c1, _s = slice(c0, c1).indices(self.cols)
+
+        nbpix = max(r1 - r0, 0) * max(c1 - c0, 0)
+        if nbpix == 0:
+            return [None, ] * 5
+
+        region = self.data[r0:r1, c0:c1]
+
+        if self._usable is None:
+            self._usable = self._build()
+
+        if not self._usable:
+            return (region.sum(), region.max(), region.min(),
+                    region.mean(), region.std())
+
+        shifted_sum = self._lookup(self._sat, r0, r1, c0, c1)
+        sqsum = self._lookup(self._sqsat, r0, r1, c0, c1)
+
+        if self._exact:
+            # python integers. no rounding, no overflow
+            shifted_sum, sqsum = int(shifted_sum), int(sqsum)
+            variance = (nbpix * sqsum - shifted_sum**2) / float(nbpix**2)
+            shifted_mean = shifted_sum / float(nbpix)
+        else:
+            shifted_mean = shifted_sum / nbpix
+            variance = sqsum / nbpix - shifted_mean**2
+
+        roi_sum = shifted_sum + nbpix * self._shift
+        roi_aver = shifted_mean + self._shift
+        roi_std = numpy.sqrt(max(variance, 0.0))
+
+        return roi_sum, region.max(), region.min(), roi_aver, roi_std
+
+    def calc_full(self):
+        """ Same as calc_region for the full data. Computed once """
+        if self._full is None:
+            data = self.data
+            self._full = (data.sum(), data.max(), data.min(), data.mean(), data.std())
+        return self._full
 
 
 if __name__ == '__main__':
@@ -215,9 +619,21 @@ if __name__ == '__main__':
     import sys
 
     if len(sys.argv) < 2:
-        print("Usage: %s spec cnt_num" % sys.argv[0])
+        print("Usage: %s spec cnt_num | --check" % sys.argv[0])
         sys.exit(0)
 
+    if sys.argv[1] == '--check':
+        # running statistics against batch results on synthetic scans
+        failed = False
+        for name, xdata, ydata in _synthetic_scans():
+            for step in (1, 7):
+                differ = check_running_stats(xdata, ydata, step)
+                if differ:
+                    failed = True
+                    print("%s (%d points per append): running stats differ at points %s" % (name, step, differ))
+        print(failed and "FAILED" or "running stats OK")
+        sys.exit(failed and 1 or 0)
+
     spec = sys.argv[1]
     cntnum = int(sys.argv[2])
     from pyspec.client import SpecVariable
@@ -233,3 +649,8 @@ if __name__ == '__main__':
     print(" COM: ", com)
     print("PEAK: ", str(calc_peak(xdata, ydata)))
     print("FWHM: ", str(calc_fwhm(xdata, ydata)))
+
+    # check running statistics give the same results point by point
+    differ = check_running_stats(xdata, ydata)
+    if differ:
+        print("running stats differ at points %s" % differ)
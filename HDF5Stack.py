@@ -0,0 +1,221 @@
+#******************************************************************************
+#
+#  @(#)HDF5Stack.py	1.1  10/18/26 CSS
+#
+#  "splot" Release 3
+#
+#  Copyright (c) 2026
+#  by Certified Scientific Software.
+#  All rights reserved.
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a
+#  copy of this software ("splot") and associated documentation files (the
+#  "Software"), to deal in the Software without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so, subject to
+#  the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included
+#  in all copies or substantial portions of the Software.
+#
+#  Neither the name of the copyright holder nor the names of its contributors
+#  may be used to endorse or promote products derived from this software
+#  without specific prior written permission.
+#
+#     * The software is provided "as is", without warranty of any   *
+#     * kind, express or implied, including but not limited to the  *
+#     * warranties of merchantability, fitness for a particular     *
+#     * purpose and noninfringement.  In no event shall the authors *
+#     * or copyright holders be liable for any claim, damages or    *
+#     * other liability, whether in an action of contract, tort     *
+#     * or otherwise, arising from, out of or in connection with    *
+#     * the software or the use of other dealings in the software.  *
+#
+#******************************************************************************
+
+
+"""
+This module gives access to stacks of detector frames stored in HDF5 files
+(Eiger master files, NeXus files) without loading them in memory.
+
+FrameStack opens the datasets lazily and reads frames on demand, a whole
+chunk at a time, into a bounded cache of decoded frames. FrameLoader reads
+frames in a background thread so that decompression (through hdf5plugin
+filters) does not block the GUI.
+"""
+
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from pyspec.css_logger import log
+
+try:
+    import hdf5plugin  # registers compression filters (bitshuffle, lz4...)
+except ImportError:
+    pass
+
+try:
+    import h5py
+    h5py_imported = True
+except ImportError:
+    h5py_imported = False
+
+from Constants import FRAME_CACHE_MB
+from ScanCache import ScanCache
+
+# where Eiger master files link their data files
+EIGER_DATA_GROUP = '/entry/data'
+
+def find_frame_datasets(h5file):
+    """ Returns the datasets holding frames, in stack order """
+
+    datasets = []
+
+    group = h5file.get(EIGER_DATA_GROUP)
+    if group is not None:
+        for name in sorted(group.keys()):
+            try:
+                dset = group[name]   # external links to missing files fail here
+            except (KeyError, OSError):
+                log.log(2, "cannot open %s in %s" % (name, EIGER_DATA_GROUP))
+                continue
+            if isinstance(dset, h5py.Dataset) and dset.ndim >= 2:
+                datasets.append(dset)
+
+    if datasets:
+        return datasets
+
+    # otherwise the first image-like dataset found
+    def visit(name, obj):
+        if isinstance(obj, h5py.Dataset) and obj.ndim >= 2:
+            datasets.append(obj)
+            return True
+
+    h5file.visititems(visit)
+    return datasets
+
+class FrameStack(object):
+
+    def __init__(self, filename, cache_mb=FRAME_CACHE_MB):
+        self.filename = filename
+        self.h5file = h5py.File(filename, 'r')
+        self.datasets = find_frame_datasets(self.h5file)
+
+        # first frame number of each dataset
+        self.starts = []
+        self.nbframes = 0
+        for dset in self.datasets:
+            self.starts.append(self.nbframes)
+            self.nbframes += (dset.ndim == 2) and 1 or dset.shape[0]
+
+        self.cache = ScanCache(cache_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.nbframes
+
+    def close(self):
+        with self.lock:
+            self.cache.clear()
+            self.h5file.close()
+
+    def get_frame(self, index):
+        """ Returns the frame if it is already decoded. None otherwise """
+        record = self.cache.get(index)
+        if record is not None:
+            return record['data']
+
+    def read_frame(self, index):
+        """
+        Returns the frame, reading it if needed. The frames sharing its chunk
+        are decoded anyway by HDF5 and are kept in the cache as well
+        """
+        frame = self.get_frame(index)
+        if frame is not None:
+            return frame
+
+        if index < 0 or index >= self.nbframes:
+            raise IndexError("frame %s out of range (%s frames)" % (index, self.nbframes))
+
+        dsetno = self._locate(index)
+        dset = self.datasets[dsetno]
+        start = self.starts[dsetno]
+
+        with self.lock:
+            if dset.ndim == 2:
+                block, beg = dset[()][None], 0
+            else:
+                beg, end = self._chunk_range(dset, index - start)
+                block = dset[beg:end]
+
+        # the frame asked for is added last. it is the one kept if
+        # the chunk does not fit in the cache
+        for frameno in range(len(block)):
+            if start + beg + frameno != index:
+                self.cache.put(start + beg + frameno, data=block[frameno])
+
+        frame = block[index - start - beg]
+        self.cache.put(index, data=frame)
+        return frame
+
+    def _locate(self, index):
+        dsetno = 0
+        while dsetno + 1 < len(self.starts) and self.starts[dsetno + 1] <= index:
+            dsetno += 1
+        return dsetno
+
+    def _chunk_range(self, dset, local):
+        # frames of the chunk containing frame `local` in dset
+        chunks = dset.chunks
+        if not chunks or chunks[0] <= 1:
+            return local, local + 1
+        beg = (local // chunks[0]) * chunks[0]
+        return beg, min(beg + chunks[0], dset.shape[0])
+
+class FrameLoader(threading.Thread):
+    """ Reads frames of a FrameStack in background """
+
+    def __init__(self, stack, *args):
+        self.stack = stack
+        self.requests = queue.Queue()
+        self.loaded = queue.Queue()
+        self.stop_it = False
+        threading.Thread.__init__(self, *args)
+        self.daemon = True
+
+    def request(self, indexes):
+        """ Frames to read, in order. Frames of previous requests not read yet are dropped """
+        try:
+            while True:
+                self.requests.get_nowait()
+        except queue.Empty:
+            pass
+
+        for index in indexes:
+            if 0 <= index < len(self.stack) and self.stack.get_frame(index) is None:
+                self.requests.put(index)
+
+    def request_stop(self):
+        self.stop_it = True
+        self.requests.put(None)
+
+    def run(self):
+        while not self.stop_it:
+            index = self.requests.get()
+            if index is None:
+                break
+
+            try:
+                self.stack.read_frame(index)
+            except:
+                import traceback
+                log.log(2, "cannot read frame %s from %s" % (index, self.stack.filename))
+                log.log(2, traceback.format_exc())
+                continue
+
+            self.loaded.put(index)
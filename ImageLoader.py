@@ -0,0 +1,192 @@
+#******************************************************************************
+#
+#  @(#)ImageLoader.py	1.1  10/18/26 CSS
+#
+#  "splot" Release 3
+#
+#  Copyright (c) 2026
+#  by Certified Scientific Software.
+#  All rights reserved.
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a
+#  copy of this software ("splot") and associated documentation files (the
+#  "Software"), to deal in the Software without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so, subject to
+#  the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included
+#  in all copies or substantial portions of the Software.
+#
+#  Neither the name of the copyright holder nor the names of its contributors
+#  may be used to endorse or promote products derived from this software
+#  without specific prior written permission.
+#
+#     * The software is provided "as is", without warranty of any   *
+#     * kind, express or implied, including but not limited to the  *
+#     * warranties of merchantability, fitness for a particular     *
+#     * purpose and noninfringement.  In no event shall the authors *
+#     * or copyright holders be liable for any claim, damages or    *
+#     * other liability, whether in an action of contract, tort     *
+#     * or otherwise, arising from, out of or in connection with    *
+#     * the software or the use of other dealings in the software.  *
+#
+#******************************************************************************
+
+
+"""
+This module reads image files (TIFF, ITEX, HDF5, formats supported by fabio)
+in a pool of worker threads so that large or remote files do not freeze the
+GUI.  Each image is handed back as an ndarray together with its min/max
+values and histogram, computed in the worker as well.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import numpy as np
+
+from pyspec.graphics.QVariant import QObject, QTimer, pyqtSignal
+from pyspec.css_logger import log
+
+from Constants import IMAGE_LOADER_WORKERS, FRAME_POLL_INTERVAL
+from LoadImageDialog import LoadImageDialog
+from Colormap import FrameHistogram
+from HDF5Stack import FrameStack
+
+try:
+    import fabio
+    fabio_imported = True
+except ImportError:
+    fabio_imported = False
+
+def read_image(filename, imgformat):
+    """ Reads the image in filename. For HDF5 stacks the first frame """
+
+    if imgformat == 'TIFF':
+        from pyspec.file.tiff import TiffFile
+        return TiffFile(filename).asarray()
+    elif imgformat == 'ITEX':
+        from pyspec.file.hamamatsu import ItexImage
+        return ItexImage(filename).data
+    elif imgformat == 'HDF5':
+        stack = FrameStack(filename)
+        try:
+            return stack.read_frame(0)
+        finally:
+            stack.close()
+    elif fabio_imported:
+        return fabio.open(filename).data
+
+    raise ValueError("unsupported image format %s" % imgformat)
+
+def image_stats(data):
+    """ Returns min, max and histogram (a FrameHistogram) of the image """
+    histogram = FrameHistogram()
+    histogram.update(data)
+    return {'min': histogram.min, 'max': histogram.max, 'histogram': histogram}
+
+def image_files(dirname, imgformat):
+    """ Files in dirname with a suffix of the given format, sorted by name """
+    suffixes = [sufx for sufx, ftype in LoadImageDialog.known_suffixes.items()
+                        if ftype == imgformat]
+
+    filenames = []
+    for name in sorted(os.listdir(dirname)):
+        sufx = os.path.splitext(name)[1][1:].lower()
+        if sufx in suffixes or (not suffixes and sufx):
+            filename = os.path.join(dirname, name)
+            if os.path.isfile(filename):
+                filenames.append(filename)
+
+    return filenames
+
+class ImageLoader(QObject):
+
+    # filename, image record: {'filename', 'data', 'min', 'max', 'histogram'}
+    imageLoaded = pyqtSignal(str, object)
+    loadFailed = pyqtSignal(str, str)
+    progress = pyqtSignal(int, int)   # images done, images queued
+
+    def __init__(self, workers=IMAGE_LOADER_WORKERS):
+        super(ImageLoader, self).__init__()
+
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.futures = {}
+        self.results = queue.Queue()
+
+        self.done = 0
+        self.total = 0
+
+        # results are delivered in the GUI thread
+        self.timer = QTimer()
+        self.timer.timeout.connect(self._deliver)
+
+    def load(self, filenames, imgformat):
+        """ Queues files to be read. Files already queued are not added again """
+        for filename in filenames:
+            if filename in self.futures:
+                continue
+            self.futures[filename] = self.pool.submit(self._load, filename, imgformat)
+            self.total += 1
+
+        if self.futures and not self.timer.isActive():
+            self.timer.start(FRAME_POLL_INTERVAL)
+
+    def isLoading(self, filename):
+        return filename in self.futures
+
+    def cancel(self, keep=()):
+        """ Drops the files not delivered yet, except those in keep """
+        for filename in list(self.futures):
+            if filename not in keep:
+                self.futures.pop(filename).cancel()
+        self.done = 0
+        self.total = len(self.futures)
+
+    def shutdown(self):
+        self.cancel()
+        self.timer.stop()
+        self.pool.shutdown(wait=False)
+
+    def _load(self, filename, imgformat):
+        # runs in a worker thread
+        try:
+            data = np.asarray(read_image(filename, imgformat))
+            record = image_stats(data)
+            record['filename'] = filename
+            record['data'] = data
+            self.results.put((filename, record, None))
+        except BaseException as e:
+            import traceback
+            log.log(2, traceback.format_exc())
+            self.results.put((filename, None, str(e)))
+
+    def _deliver(self):
+        try:
+            while True:
+                filename, record, error = self.results.get_nowait()
+                if filename not in self.futures:  # cancelled while being read
+                    continue
+
+                self.futures.pop(filename)
+                self.done += 1
+
+                if error is not None:
+                    self.loadFailed.emit(filename, error)
+                else:
+                    self.imageLoaded.emit(filename, record)
+
+                self.progress.emit(self.done, self.total)
+        except queue.Empty:
+            pass
+
+        if not self.futures:
+            self.timer.stop()
+            self.done = self.total = 0
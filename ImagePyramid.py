@@ -0,0 +1,96 @@
+#******************************************************************************
+#
+#  @(#)ImagePyramid.py	1.1  10/18/26 CSS
+#
+#  "splot" Release 3
+#
+#  Copyright (c) 2026
+#  by Certified Scientific Software.
+#  All rights reserved.
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a
+#  copy of this software ("splot") and associated documentation files (the
+#  "Software"), to deal in the Software without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so, subject to
+#  the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included
+#  in all copies or substantial portions of the Software.
+#
+#  Neither the name of the copyright holder nor the names of its contributors
+#  may be used to endorse or promote products derived from this software
+#  without specific prior written permission.
+#
+#     * The software is provided "as is", without warranty of any   *
+#     * kind, express or implied, including but not limited to the  *
+#     * warranties of merchantability, fitness for a particular     *
+#     * purpose and noninfringement.  In no event shall the authors *
+#     * or copyright holders be liable for any claim, damages or    *
+#     * other liability, whether in an action of contract, tort     *
+#     * or otherwise, arising from, out of or in connection with    *
+#     * the software or the use of other dealings in the software.  *
+#
+#******************************************************************************
+
+
+"""
+Multi-resolution pyramid of an image for display.
+
+Each level halves the previous one, every pixel being the maximum (or the
+mean) of a 2x2 block.  Maximum pooling keeps isolated hot pixels and narrow
+peaks visible at any zoom level.  To draw a view, the level with about one
+pixel per screen pixel is chosen and cropped to the part in view, so the
+plot toolkit never receives much more than a screenful of pixels.
+"""
+
+import math
+
+import numpy as np
+
+def block_reduce(data, mode="max"):
+    """ Halves a 2D array, pooling 2x2 blocks. Odd sizes repeat the last row/column """
+    rows, cols = data.shape[:2]
+
+    if rows % 2 or cols % 2:
+        data = np.pad(data, ((0, rows % 2), (0, cols % 2)), mode='edge')
+
+    blocks = data.reshape(data.shape[0] // 2, 2, data.shape[1] // 2, 2)
+
+    if mode == "mean":
+        return blocks.mean(axis=(1, 3))
+    return blocks.max(axis=(1, 3))
+
+class ImagePyramid(object):
+
+    def __init__(self, data, mode="max"):
+        self.mode = mode
+        self.levels = [data]
+
+        # down to a single pixel
+        self.nblevels = int(math.ceil(math.log(max(max(data.shape[:2]), 1), 2))) + 1
+
+    def level(self, levelno):
+        """ Returns the image reduced 2**levelno times. Levels are built once, when first asked """
+        levelno = min(levelno, self.nblevels - 1)
+        while len(self.levels) <= levelno:
+            self.levels.append(block_reduce(self.levels[-1], self.mode))
+        return self.levels[levelno]
+
+    def level_for(self, scale):
+        """ Highest level with at least one pixel per screen pixel for `scale` image pixels per screen pixel """
+        if scale < 2:
+            return 0
+        return min(int(math.floor(math.log(scale, 2))), self.nblevels - 1)
+
+    def view(self, rows, cols, scale):
+        """
+        Returns level number, rows and columns at that level covering
+        image rows rows[0]:rows[1] and columns cols[0]:cols[1]
+        """
+        levelno = self.level_for(scale)
+        factor = 2 ** levelno
+        lrows = (rows[0] // factor, -(-rows[1] // factor))
+        lcols = (cols[0] // factor, -(-cols[1] // factor))
+        return levelno, lrows, lcols
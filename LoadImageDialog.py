@@ -76,6 +76,10 @@ class LoadImageDialog(QDialog):
         file_bt = QPushButton('...')
         file_bt.clicked.connect(self.select_file)
 
+        # all images of the selected format in a directory
+        dir_bt = QPushButton('Dir...')
+        dir_bt.clicked.connect(self.select_directory)
+
         format_label = QLabel("Format:")
         self.format_cbox = QComboBox()
         self.format_cbox.addItems(self.get_formats())
@@ -86,6 +90,7 @@ class LoadImageDialog(QDialog):
         gridLayout.addWidget(file_label, 0, 0)
         gridLayout.addWidget(self.file_entry, 0, 1,1,2)
         gridLayout.addWidget(file_bt, 0, 3)
+        gridLayout.addWidget(dir_bt, 0, 4)
 
         gridLayout.addWidget(format_label,1,0)
         gridLayout.addWidget(self.format_cbox,1,1)
@@ -198,6 +203,12 @@ class LoadImageDialog(QDialog):
         if filename:
             self.set_filename(filename)
 
+    def select_directory(self):
+        dirname = QFileDialog.getExistingDirectory(self, "Open Image Directory", self.filedir)
+
+        if dirname:
+            self.set_filename(str(dirname))
+
     def cancelPushButtonClicked(self):
         self.reject()
 
@@ -189,12 +189,14 @@ class McaSource(DataSource1D):
                                     "    pip (or pip3) install h5py")
                 else:
                     try:
-                        f = h5py.File(filename)
-                        log.log(2,"hdf5 1")
-                        d = f['/entry/data/data_000001'][()]
-                        log.log(2, "hdf5 2 %s" % str(d.shape))
-                        data = d[0]
-                        log.log(2, "hdf5 3")
+                        # only the first spectrum is read (not the whole dataset)
+                        f = h5py.File(filename, 'r')
+                        try:
+                            dset = f['/entry/data/data_000001']
+                            log.log(2, "hdf5 dataset shape %s" % str(dset.shape))
+                            data = dset[()] if dset.ndim == 1 else dset[0]
+                        finally:
+                            f.close()
                     except:
                         import traceback
                         log.log(3,traceback.format_exc())
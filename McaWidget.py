@@ -269,6 +269,7 @@ class McaCanvas(QWidget):
         self.selecting = False
 
         self.zoomrect = None
+        self.mca_line = None
         self.last_selrect = None
         self.last_line = None
         self.hl_mkr = None
@@ -378,6 +379,11 @@ class McaCanvas(QWidget):
 
         self.mca_axes.set_xlabel(xlabel) # , fontsize=8)
         self.mca_axes.set_ylabel(ylabel) # , fontsize=8)
+
+        # the selection span is redrawn from the current selection
+        if self.last_line:
+            self.last_line.remove()
+            self.last_line = None
         self._display_selection()
 
         #self.fig.subplots_adjust(left=0.0, right=1.0, top=1.0, bottom=0.0)
@@ -386,8 +392,16 @@ class McaCanvas(QWidget):
         log.log(2, "Refreshing plot took %s" % (time.time()-t0))
 
     def do_plot(self):
-        self.mca_axes.clear()
-        self.p, = self.mca_axes.plot(self.xdata, self.ydata)
+        # the line is created once and then updated in place. Clearing the
+        # axes and plotting again on every refresh is far too slow for live mca data
+        if self.mca_line is None:
+            self.mca_line, = self.mca_axes.plot(self.xdata, self.ydata)
+        else:
+            self.mca_line.set_data(self.xdata, self.ydata)
+
+        # reset zoom to the new data (as clearing the axes did before)
+        self.mca_axes.relim()
+        self.mca_axes.autoscale(True)
 
     def get_selection_mode(self):
         return self.selection_mode 
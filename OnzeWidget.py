@@ -58,7 +58,10 @@ from pyspec.css_logger import log, log_exception
 
 from DialogTools import getPrinter, getSaveFile
 from Preferences import Preferences
-from Colormap import Colormap, ColormapDialog
+from Colormap import Colormap, ColormapDialog, FrameHistogram
+from DataStatistics import RegionStats
+from ImagePyramid import ImagePyramid
+from Constants import PYRAMID_MIN_PIXELS
 
 import icons
 
@@ -252,10 +255,13 @@ class OnzeWidget(QWidget):
     def getPlot(self):
         return self.canvas
 
-    def setData(self, data, metadata):
+    def setData(self, data, metadata, stats=None):
         self.data = data
         self.metadata = metadata
-        self.canvas.set_data(data, metadata)
+        self.canvas.set_data(data, metadata, stats)
+
+    def getRegionStats(self):
+        return self.canvas.region_stats
 
     def setActive(self):
         self.active = True
@@ -442,7 +448,15 @@ class OnzeCanvas(QWidget):
         QWidget.__init__(self, *args)
 
         self.fulldata = None
+        # counts frames given to set_data. live frames may be refilled in
+        # place, so cached results are keyed on it rather than on the array
+        self.frame_generation = 0
         self.selected_data = None
+        self.region_stats = None
+        self.image_stats = None
+        # histogram of frames given without stats (keeps its bins for live data)
+        self.live_histogram = FrameHistogram()
+        self.histogram = self.live_histogram
 
         self.selection_mode = MODE_ZOOM
         self.selection_type = NO_SELECTION
@@ -453,6 +467,12 @@ class OnzeCanvas(QWidget):
         self.last_selrect = None
         self.cb = None
         self.im = None
+        self.im_extent = None
+        self.im_units = None
+        self.pyramid = None
+        self.pyramid_generation = None
+        self.view_key = None
+        self.editing_colormap = False
         self.last_line = None
         self.hl_mkr = None
 
@@ -511,6 +531,9 @@ class OnzeCanvas(QWidget):
         #self.canvas.mpl_connect("scroll_event", self.scrolled_zoom)
 
         self.im_axes = self.fig.add_subplot(111)
+        self.im_axes.callbacks.connect('xlim_changed', self.view_changed)
+        self.im_axes.callbacks.connect('ylim_changed', self.view_changed)
+        self.canvas.mpl_connect("resize_event", self.view_changed)
 
         self.colormap = Colormap()
         self.colormap.colormapChanged.connect(self.colormap_changed)
@@ -522,7 +545,7 @@ class OnzeCanvas(QWidget):
  
     def edit_colormap(self):
         self.editing_colormap = True
-        diag = ColormapDialog(self.colormap, self, data=self.fulldata)
+        diag = ColormapDialog(self.colormap, self, data=self.fulldata, histogram=self.histogram)
         diag.accepted.connect(self.diag_colormap_closed)
         diag.rejected.connect(self.diag_colormap_closed)
         ret = diag.show()
@@ -549,18 +572,31 @@ class OnzeCanvas(QWidget):
             self.hl_mkr = None
             self.canvas.draw()
 
-    def set_data(self, data, metadata=None):
+    def set_data(self, data, metadata=None, stats=None):
+        # stats (min, max, histogram) may come precomputed with the image
         if isinstance(data, list):
             data = np.array(data)
 
         self.fulldata = data
+        self.frame_generation += 1
         self.metadata = metadata
+        self.image_stats = stats
+
+        # one histogram per frame gives range and auto-contrast limits
+        if stats is not None and stats.get('histogram') is not None:
+            self.histogram = stats['histogram']
+        else:
+            self.live_histogram.update(data, self.frame_generation)
+            self.histogram = self.live_histogram
+
+        # summed-area tables are only built while a region is selected
+        self.region_stats = RegionStats(data)
         self.data = self.fulldata
         self.update_data()
 
     def update_data(self):
         self.rows, self.cols = self.data.shape
-        self.colormap.datarange = (self.data.min(), self.data.max())
+        self.colormap.histogram = self.histogram
 
         #self.cb_axes = self.fig.colorbar(self.im, ax = self.im_axes)
 
@@ -607,13 +643,121 @@ class OnzeCanvas(QWidget):
         self.refresh_image()
 
     def display_image(self):
-        
-        self.im_axes.clear()
-        self.im = self.im_axes.imshow(self.data, cmap=self.colormap.colormap, \
-                norm=self.colormap.norm, interpolation='nearest',
+        extent = self.x_range + self.y_range
+
+        relayout = False
+
+        # large frames are drawn from reduced images, cropped to the view.
+        # the pyramid is built once per frame
+        if self.data.size <= PYRAMID_MIN_PIXELS:
+            self.pyramid = None
+        elif self.pyramid is None or self.pyramid_generation != self.frame_generation:
+            self.pyramid = ImagePyramid(self.data)
+            self.pyramid_generation = self.frame_generation
+
+        self.view_key = None
+
+        if self.im is None:
+            self.im = self.im_axes.imshow(np.zeros((1,1,4), dtype=np.uint8),
+                interpolation='nearest',
                 origin=self.origin,aspect=self.aspect,
-                extent=self.x_range+self.y_range)
+                extent=extent)
+            relayout = True
+        else:
+            self.im_axes.set_aspect(self.aspect)
+
+        if extent != self.im_extent:
+            # new image size. show it full
+            self.im_extent = extent
+            self.im_axes.set_xlim(extent[0], extent[1])
+            self.im_axes.set_ylim(extent[2], extent[3])
+            relayout = True
+
+        self.render_view()
+
+        if relayout or (self.xunits, self.yunits) != self.im_units:
+            self.im_units = (self.xunits, self.yunits)
+            self._format_axes()
+            relayout = True
+
+        return relayout
+
+    def render_view(self):
+        """ Updates the image drawn for the current view. Returns True if it changed """
+        if self.im is None or self.im_extent is None:
+            return False
+
+        # the colormap is applied through a lookup table. matplotlib
+        # only receives an RGBA uint8 image and the AxesImage is reused
+        if self.pyramid is None:
+            key = 'full'
+            if key == self.view_key:
+                return False
+            rgba = self.colormap.to_rgba(self.data, self.frame_generation)
+            extent = self.im_extent
+        else:
+            levelno, rows, cols, extent = self._pyramid_view()
+            key = (levelno, rows, cols)
+            if key == self.view_key:
+                return False
+            level = self.pyramid.level(levelno)
+            rgba = self.colormap.to_rgba(level[rows[0]:rows[1], cols[0]:cols[1]])
+            log.log(3, "showing pyramid level %d, %s pixels" % (levelno, str(rgba.shape[:2])))
+
+        self.view_key = key
+        self.im.set_data(rgba)
+        self.im.set_extent(extent)
+        return True
+
+    def _pyramid_view(self):
+        # image rows/columns in view, and screen pixels to show them
+        x0, x1, y0, y1 = self.im_extent
+        dx = (x1 - x0) / float(self.cols) or 1.0
+        dy = (y1 - y0) / float(self.rows) or 1.0
+
+        xlim = sorted(self.im_axes.get_xlim())
+        ylim = sorted(self.im_axes.get_ylim())
+
+        c0 = int(np.floor((xlim[0] - x0) / dx))
+        c1 = int(np.ceil((xlim[1] - x0) / dx))
+
+        if self.origin == "upper":   # row 0 at the top (y1)
+            r0 = int(np.floor((y1 - ylim[1]) / dy))
+            r1 = int(np.ceil((y1 - ylim[0]) / dy))
+        else:
+            r0 = int(np.floor((ylim[0] - y0) / dy))
+            r1 = int(np.ceil((ylim[1] - y0) / dy))
 
+        c0 = min(max(c0, 0), self.cols - 1)
+        c1 = min(max(c1, c0 + 1), self.cols)
+        r0 = min(max(r0, 0), self.rows - 1)
+        r1 = min(max(r1, r0 + 1), self.rows)
+
+        bbox = self.im_axes.get_window_extent()
+        scale = min((c1 - c0) / max(bbox.width, 1.0), (r1 - r0) / max(bbox.height, 1.0))
+
+        levelno, rows, cols = self.pyramid.view((r0, r1), (c0, c1), scale)
+
+        # extent of the cropped level. a reduced pixel covers 2**levelno pixels
+        factor = 2 ** levelno
+        left = x0 + cols[0] * factor * dx
+        right = x0 + cols[1] * factor * dx
+
+        if self.origin == "upper":
+            top = y1 - rows[0] * factor * dy
+            bottom = y1 - rows[1] * factor * dy
+        else:
+            bottom = y0 + rows[0] * factor * dy
+            top = y0 + rows[1] * factor * dy
+
+        return levelno, rows, cols, [left, right, bottom, top]
+
+    def view_changed(self, *args):
+        # zoom, pan or resize
+        if self.render_view():
+            self.canvas.draw_idle()
+
+    def _format_axes(self):
         xaxis = self.im_axes.get_xaxis()
         if self.xunits is None:
             xaxis.set_visible(False)
@@ -639,11 +783,13 @@ class OnzeCanvas(QWidget):
     def refresh_image(self):
         t0 = time.time()
 
-        self.display_image()
+        relayout = self.display_image()
+        self.reset_selection()
         self._display_selection()
-        self.canvas.draw()
         #self.fig.subplots_adjust(left=0.0, right=1.0, top=1.0, bottom=0.0)
-        self.fig.tight_layout()
+        if relayout:
+            self.fig.tight_layout()
+        self.canvas.draw()
 
         log.log(2, "Refreshing image took %s" % (time.time()-t0))
 
@@ -893,11 +1039,13 @@ class OnzeCanvas(QWidget):
         roi_min = None
         roi_aver = None
         roi_std = None
+        roi_region = None  # rows/columns slice limits for rectangular selections
 
         if self.selection_type is HORIZONTAL:
             # select 
             beg_pos,end_pos = self.selection_position
             self.selected_data = self.fulldata[beg_pos:end_pos+1,:]
+            roi_region = (beg_pos, end_pos+1, 0, None)
             line_data = self.selected_data.sum(axis=0)
 
             selrange = [beg_pos, end_pos, 0, self.cols-1]
@@ -914,6 +1062,7 @@ class OnzeCanvas(QWidget):
             # select 
             beg_pos,end_pos = self.selection_position
             self.selected_data = self.fulldata[:,beg_pos:end_pos+1]
+            roi_region = (0, None, beg_pos, end_pos+1)
             line_data = self.selected_data.sum(axis=1)
 
             selrange = [0, self.rows-1, beg_pos, end_pos]
@@ -947,6 +1096,7 @@ class OnzeCanvas(QWidget):
             x0, y0 = coords[0]
             x1, y1 = coords[1]
             self.selected_data = self.fulldata[y0:y1,x0:x1]
+            roi_region = (y0, y1, x0, x1)
 
             selrange = [y0,y1-1,x0,x1-1] # rowbeg, rowend, colbeg,colend
 
@@ -963,11 +1113,18 @@ class OnzeCanvas(QWidget):
             else:
                 roi_shape = roi_shape[0]
                 roi_nbpix = roi_shape
-            roi_sum = self.selected_data.sum()
-            roi_max = self.selected_data.max()
-            roi_min = self.selected_data.min()
-            roi_aver = self.selected_data.mean()
-            roi_std = self.selected_data.std()
+            if roi_region is not None:
+                roi_sum, roi_max, roi_min, roi_aver, roi_std = \
+                        self.region_stats.calc_region(*roi_region)
+            else:
+                roi_sum = self.selected_data.sum()
+                roi_max = self.selected_data.max()
+                roi_min = self.selected_data.min()
+                roi_aver = self.selected_data.mean()
+                roi_std = self.selected_data.std()
+
+        if roi_region is None and self.region_stats is not None:
+            self.region_stats.release()
 
         self.selection_info['selection'] = SELECTION_TYPE[self.selection_type]
         self.selection_info['coords'] = title
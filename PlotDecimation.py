@@ -0,0 +1,191 @@
+#******************************************************************************
+#
+#  @(#)PlotDecimation.py	1.1  10/18/26 CSS
+#
+#  "splot" Release 3
+#
+#  Copyright (c) 2026
+#  by Certified Scientific Software.
+#  All rights reserved.
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a
+#  copy of this software ("splot") and associated documentation files (the
+#  "Software"), to deal in the Software without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so, subject to
+#  the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included
+#  in all copies or substantial portions of the Software.
+#
+#  Neither the name of the copyright holder nor the names of its contributors
+#  may be used to endorse or promote products derived from this software
+#  without specific prior written permission.
+#
+#     * The software is provided "as is", without warranty of any   *
+#     * kind, express or implied, including but not limited to the  *
+#     * warranties of merchantability, fitness for a particular     *
+#     * purpose and noninfringement.  In no event shall the authors *
+#     * or copyright holders be liable for any claim, damages or    *
+#     * other liability, whether in an action of contract, tort     *
+#     * or otherwise, arising from, out of or in connection with    *
+#     * the software or the use of other dealings in the software.  *
+#
+#******************************************************************************
+
+
+"""
+Level of detail reduction of curves before they are handed to the plot.
+
+A curve with many more points than the plot has pixel columns is reduced
+to at most four points per column: the first, last, minimum and maximum
+points falling in that column (M4 decimation).  The line drawn with the
+reduced points covers exactly the same pixels as the line drawn with all
+points, while the plot toolkit only receives a few thousand points.
+"""
+
+import time
+
+import numpy as np
+
+from Constants import LOD_MIN_POINTS
+
+
+def minmax_decimate(xdata, ydata, nbuckets, xrange=None):
+    """
+    Returns the indexes of the points in (xdata, ydata) to draw the curve on
+    nbuckets pixel columns spanning xrange (the whole curve if None). Points 
+    outside xrange are kept at a coarser resolution, so that the curve is 
+    still there while panning.
+
+    Returns None if the curve is short enough to be drawn as it is or if it 
+    cannot be decimated (xdata is not monotonic). Decreasing xdata (e.g.
+    scans going down) is decimated as the reversed curve.
+    """
+    npts = len(xdata)
+
+    if nbuckets <= 0 or npts != len(ydata):
+        return None
+
+    if npts <= max(LOD_MIN_POINTS, 4 * nbuckets):
+        return None
+
+    xdata = np.asarray(xdata, dtype=float)
+    ydata = np.asarray(ydata)
+
+    # nan values also make this fail
+    steps = np.diff(xdata)
+    if (steps >= 0).all():
+        reverse = False
+    elif (steps <= 0).all():
+        reverse = True
+        xdata = xdata[::-1]
+        ydata = ydata[::-1]
+    else:
+        return None
+
+    if xrange is None:
+        x0, x1 = xdata[0], xdata[-1]
+    else:
+        x0, x1 = min(xrange), max(xrange)
+
+    if not x1 > x0:
+        return None
+
+    # keep one more point on each side so that lines reach the plot borders
+    first = max(np.searchsorted(xdata, x0, 'left') - 1, 0)
+    last = min(np.searchsorted(xdata, x1, 'right') + 1, npts)
+
+    indexes = []
+    if first > 0:
+        indexes.append(_decimate_segment(xdata, ydata, 0, first, nbuckets))
+    indexes.append(_decimate_segment(xdata, ydata, first, last, nbuckets))
+    if last < npts:
+        indexes.append(_decimate_segment(xdata, ydata, last, npts, nbuckets))
+
+    indexes = np.concatenate(indexes)
+    if reverse:
+        # back to positions in the original order, in increasing order
+        indexes = (npts - 1 - indexes)[::-1]
+
+    return indexes
+
+
+def _decimate_segment(xdata, ydata, beg, end, nbuckets):
+    """ M4 decimation of points beg to end (excluded) of a sorted curve """
+
+    if end - beg <= 4 * nbuckets:
+        return np.arange(beg, end)
+
+    xs = xdata[beg:end]
+    ys = ydata[beg:end]
+
+    x0, x1 = xs[0], xs[-1]
+    if not x1 > x0:
+        return np.array([beg, end - 1])
+
+    buckets = ((xs - x0) * (nbuckets / (x1 - x0))).astype(int)
+    np.clip(buckets, 0, nbuckets - 1, out=buckets)
+
+    # xs is sorted. buckets are runs of consecutive points
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.concatenate((starts[1:], [len(xs)])) - 1
+
+    segno = np.repeat(np.arange(len(starts)), ends - starts + 1)
+
+    # fmin/fmax ignore nan values (all nan buckets keep first and last only)
+    with np.errstate(invalid='ignore'):
+        ymins = np.fmin.reduceat(ys, starts)
+        ymaxs = np.fmax.reduceat(ys, starts)
+
+        imins = _first_in_segment(ys == ymins[segno], segno)
+        imaxs = _first_in_segment(ys == ymaxs[segno], segno)
+
+    return np.unique(np.concatenate((starts, ends, imins, imaxs))) + beg
+
+
+def _first_in_segment(mask, segno):
+    """ Returns the index of the first True value of mask in every segment """
+    pos = np.flatnonzero(mask)
+    if not len(pos):
+        return pos
+
+    segs = segno[pos]
+    return pos[np.concatenate(([True], segs[1:] != segs[:-1]))]
+
+
+def benchmark(npts=1000000, width=1000):
+    xdata = np.arange(npts, dtype=float)
+    ydata = np.random.normal(size=npts).cumsum()
+
+    t0 = time.time()
+    idx = minmax_decimate(xdata, ydata, width)
+    t1 = time.time()
+
+    print("%d points decimated to %d for %d pixels in %.3f secs" % (npts, len(idx), width, t1 - t0))
+
+    # the decimated curve keeps the extremes of every pixel column
+    assert ydata[idx].min() == ydata.min()
+    assert ydata[idx].max() == ydata.max()
+
+    t0 = time.time()
+    idx = minmax_decimate(xdata, ydata, width, (npts * 0.4, npts * 0.5))
+    t1 = time.time()
+
+    print("zoomed to 10%%: %d points kept in %.3f secs" % (len(idx), t1 - t0))
+
+    # scans going down are decimated as well
+    idx = minmax_decimate(xdata[::-1], ydata[::-1], width)
+    assert idx is not None
+    assert ydata[::-1][idx].min() == ydata.min()
+    assert ydata[::-1][idx].max() == ydata.max()
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) > 1:
+        benchmark(int(sys.argv[1]))
+    else:
+        benchmark()
@@ -54,6 +54,9 @@ PlotDefaults = {
     'maxlinethick': 6,
     'showlegend': True,
     'legendpos': 'auto',
+    'webglpoints': 50000,
+    'minwebglpoints': 1000,
+    'maxwebglpoints': 10000000,
 }
 
 LegendPositions = ['auto', 'top_left', 'top_center', 'top_right', 'bottom_left', 'bottom_center', 'bottom_right']
@@ -93,10 +96,20 @@ class PlotOptionsDialog(QDialog, Ui_plotOptionsDialog):
         self.lineThickSpin.setRange(
             PlotDefaults['minlinethick'], PlotDefaults['maxlinethick'])
 
+        # curves with more points are drawn with WebGL (plotly only)
+        self.webglLabel = QLabel("WebGL above:")
+        self.webglSpin = QSpinBox()
+        self.webglSpin.setRange(
+            PlotDefaults['minwebglpoints'], PlotDefaults['maxwebglpoints'])
+        self.webglSpin.setSingleStep(10000)
+        self.webglSpin.setSuffix(" pts")
+
         self.optionsLayout.addWidget(self.useDotsSwitch, 0, 1)
         self.optionsLayout.addWidget(self.useLinesSwitch, 1, 1)
         #self.optionsLayout.addWidget(self.showErrorBarsSwitch, 2, 1)
         self.optionsLayout.addWidget(self.showLegendSwitch, 3, 1)
+        self.optionsLayout.addWidget(self.webglLabel, 2, 2)
+        self.optionsLayout.addWidget(self.webglSpin, 2, 3)
 
         showbars = self.prefs.getValue('showbars')
         if showbars is not None:
@@ -146,6 +159,13 @@ class PlotOptionsDialog(QDialog, Ui_plotOptionsDialog):
             self.legendpos = PlotDefaults['legendpos']
         self.initial_legendpos = self.legendpos
 
+        webglpoints = self.prefs.getValue('webglpoints')
+        if webglpoints is not None:
+            self.webglpoints = int(webglpoints)
+        else:
+            self.webglpoints = PlotDefaults['webglpoints']
+        self.initial_webglpoints = self.webglpoints
+
         self.legendPositionCombo.addItems(LegendPositions)
 
         self._check_disable_entries()
@@ -157,6 +177,7 @@ class PlotOptionsDialog(QDialog, Ui_plotOptionsDialog):
 
         self.dotSizeSpin.valueChanged.connect(self.apply)
         self.lineThickSpin.valueChanged.connect(self.apply)
+        self.webglSpin.valueChanged.connect(self.apply)
         self.legendPositionCombo.currentIndexChanged.connect(self.apply)
 
         self.restoreButton.clicked.connect(self.restore_defaults)
@@ -180,6 +201,8 @@ class PlotOptionsDialog(QDialog, Ui_plotOptionsDialog):
             posidx = 0
         self.legendPositionCombo.setCurrentIndex(posidx)
 
+        self.webglSpin.setValue(self.webglpoints)
+
         self._auto_updating = False
 
     def show(self):
@@ -216,8 +239,10 @@ class PlotOptionsDialog(QDialog, Ui_plotOptionsDialog):
         showlegend = self.showLegendSwitch.isChecked()
         legendpos = str(self.legendPositionCombo.currentText())
 
+        webglpoints = self.webglSpin.value()
+
         return ((dotsflag, dotsize), (lineflag, linethick), \
-                           barsflag, (showlegend, legendpos))
+                           barsflag, (showlegend, legendpos), webglpoints)
 
 
     def restore_defaults(self):
@@ -231,6 +256,7 @@ class PlotOptionsDialog(QDialog, Ui_plotOptionsDialog):
 
         self.showlegend = PlotDefaults['showlegend']
         self.legendpos = PlotDefaults['legendpos']
+        self.webglpoints = PlotDefaults['webglpoints']
 
         log.log(3,"setting default legend to %s / %s" % (self.showlegend, self.legendpos))
 
@@ -243,12 +269,13 @@ class PlotOptionsDialog(QDialog, Ui_plotOptionsDialog):
         if self._auto_updating:
             return
 
-        dots, lines, bars, legend = self.get_selection()
+        dots, lines, bars, legend, webglpoints = self.get_selection()
 
         self.dotsflag, self.dotsize = dots
         self.lineflag, self.linethick = lines
         self.barsflag = bars
         self.showlegend, self.legendpos =  legend
+        self.webglpoints = webglpoints
         self._check_disable_entries()
         self._apply()
 
@@ -260,12 +287,14 @@ class PlotOptionsDialog(QDialog, Ui_plotOptionsDialog):
         self.prefs.setValue('showlegend', self.showlegend)
         self.prefs.setValue('legendpos', self.legendpos)
         self.prefs.setValue('showbars', self.lineflag)
+        self.prefs.setValue('webglpoints', self.webglpoints)
 
         if self.parent():
             self.parent().setDots(self.dotsflag, self.dotsize)
             self.parent().setLines(self.lineflag, self.linethick)
             self.parent().showErrorBars(self.barsflag)
             self.parent().setLegend(self.showlegend, self.legendpos)
+            self.parent().setWebGLPoints(self.webglpoints)
             self.parent().redrawCurves()
 
     def accept(self):
@@ -278,6 +307,7 @@ class PlotOptionsDialog(QDialog, Ui_plotOptionsDialog):
         self.lineflag = self.initial_lines
         self.dotsize = self.initial_dotsize
         self.linethick = self.initial_linethick
+        self.webglpoints = self.initial_webglpoints
         self._apply()
         self.hide()
 
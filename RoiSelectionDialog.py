@@ -46,6 +46,9 @@ class RoiSelectionDialog(QDialog):
 
     operations = ['sum','ave','max','min']
 
+    # key in the selection statistics for each roi operation
+    operation_keys = {'sum': 'sum', 'ave': 'average', 'max': 'max', 'min': 'min'}
+
     def __init__(self, parent):
 
         QDialog.__init__(self, parent)
@@ -55,6 +58,7 @@ class RoiSelectionDialog(QDialog):
 
         self.counters = {}
         self.devices = []
+        self.values = {}
 
         self.setWindowTitle("ROI Selection")
         self.setModal(False)
@@ -99,6 +103,9 @@ class RoiSelectionDialog(QDialog):
         self.col_beg_ety = QLineEdit()
         self.col_end_ety = QLineEdit()
 
+        value_label = QLabel("Value:")
+        self.value_label = QLabel()
+
         row = 0
 
         gridLayout.addWidget(self.mne_label,row,1)
@@ -137,6 +144,10 @@ class RoiSelectionDialog(QDialog):
         gridLayout.addWidget(self.col_end_ety,row,2)
         row += 1
 
+        gridLayout.addWidget(value_label, row,0)
+        gridLayout.addWidget(self.value_label,row,1,1,2)
+        row += 1
+
         line_sep = QFrame()
         try:
             line_sep.setFrameShape(QFrame.HLine)
@@ -199,6 +210,7 @@ class RoiSelectionDialog(QDialog):
         operation = str(self.oper_cbox.currentText()).lower() 
         cur_cnt = str(self.mne_cbox.currentText())
         self.counters[cur_cnt]['oper'] = operation
+        self.show_value()
 
     def counter_add(self):
         new_mne, ok = QInputDialog.getText(self, "Add new Counter", "Mnemonic:")
@@ -277,6 +289,16 @@ class RoiSelectionDialog(QDialog):
             self.col_beg_ety.setText(str(r2))
             self.col_end_ety.setText(str(r3))
 
+    def set_values(self, values):
+        # statistics for the current selection. updated live while selecting
+        self.values = values
+        self.show_value()
+
+    def show_value(self):
+        operation = str(self.oper_cbox.currentText()).lower()
+        key = self.operation_keys.get(operation, operation)
+        self.value_label.setText(str(self.values.get(key, "")))
+
     def set_devices(self, devices):
 
         self.devices = []
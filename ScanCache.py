@@ -0,0 +1,179 @@
+#******************************************************************************
+#
+#  @(#)ScanCache.py	1.1  10/18/26 CSS
+#
+#  "splot" Release 3
+#
+#  Copyright (c) 2026
+#  by Certified Scientific Software.
+#  All rights reserved.
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a
+#  copy of this software ("splot") and associated documentation files (the
+#  "Software"), to deal in the Software without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so, subject to
+#  the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included
+#  in all copies or substantial portions of the Software.
+#
+#  Neither the name of the copyright holder nor the names of its contributors
+#  may be used to endorse or promote products derived from this software
+#  without specific prior written permission.
+#
+#     * The software is provided "as is", without warranty of any   *
+#     * kind, express or implied, including but not limited to the  *
+#     * warranties of merchantability, fitness for a particular     *
+#     * purpose and noninfringement.  In no event shall the authors *
+#     * or copyright holders be liable for any claim, damages or    *
+#     * other liability, whether in an action of contract, tort     *
+#     * or otherwise, arising from, out of or in connection with    *
+#     * the software or the use of other dealings in the software.  *
+#
+#******************************************************************************
+
+
+"""
+This module implements a bounded cache of parsed scans for file sources.
+
+ScanCache keeps the parsed data, labels, metadata and mca data of the most 
+recently used scans, up to a memory budget.  ScanPrefetcher parses scans
+(data and header lines) in a background thread, typically the neighbours of
+the scan shown, so that they are already in the cache when the user moves
+to them.
+"""
+
+import threading
+from collections import OrderedDict
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from pyspec.css_logger import log
+
+from SpecFileIndex import read_scan_data, read_scan_header
+
+class ScanCache(object):
+
+    def __init__(self, budget):
+        self.budget = budget     # in bytes
+        self.nbytes = 0
+        self.records = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.records
+
+    def get(self, key):
+        with self.lock:
+            record = self.records.get(key)
+            if record is not None:
+                self.records.move_to_end(key)
+            return record
+
+    def put(self, key, **fields):
+        """ Adds or updates the fields (data, labels, meta, mcas) of the record for key """
+        with self.lock:
+            record = self.records.pop(key, None)
+            if record is None:
+                record = {}
+            else:
+                self.nbytes -= record['nbytes']
+
+            record.update(fields)
+            record['nbytes'] = self._recordSize(record)
+
+            # cached data is shared with whoever shows the scan. protect it
+            data = fields.get('data')
+            if data is not None and hasattr(data, 'flags'):
+                data.flags.writeable = False
+
+            self.records[key] = record
+            self.nbytes += record['nbytes']
+            self._evict()
+
+            return record
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+            self.nbytes = 0
+
+    def setBudget(self, budget):
+        with self.lock:
+            self.budget = budget
+            self._evict()
+
+    def _evict(self):
+        # keep at least the record just used even if it is over budget
+        while self.nbytes > self.budget and len(self.records) > 1:
+            key, record = self.records.popitem(last=False)
+            self.nbytes -= record['nbytes']
+
+    def _recordSize(self, record):
+        nbytes = 0
+
+        data = record.get('data')
+        if data is not None:
+            nbytes += data.nbytes
+
+        for mca in record.get('mcas') or []:
+            nbytes += getattr(mca, 'nbytes', 0)
+
+        return nbytes
+
+
+class ScanPrefetcher(threading.Thread):
+    """ Parses scans from a file into a ScanCache in background """
+
+    def __init__(self, filename, cache, *args):
+        self.filename = filename
+        self.cache = cache
+        self.requests = queue.Queue()
+        self.stop_it = False
+        threading.Thread.__init__(self, *args)
+        self.daemon = True
+
+    def request(self, items):
+        """ items is a list of (key, index entry) to be loaded """
+        for key, entry in items:
+            if key not in self.cache:
+                self.requests.put((key, entry))
+
+    def request_stop(self):
+        self.stop_it = True
+        self.requests.put(None)
+
+    def run(self):
+        while not self.stop_it:
+            item = self.requests.get()
+            if item is None:
+                break
+
+            key, entry = item
+            if key in self.cache:
+                continue
+
+            try:
+                data = read_scan_data(self.filename, entry)
+                meta = read_scan_header(self.filename, entry)
+            except:
+                import traceback
+                log.log(3, "cannot prefetch scan %s" % entry['number'])
+                log.log(3, traceback.format_exc())
+                continue
+
+            if data is None:
+                continue
+
+            fields = {'data': data, 'labels': entry['labels'], 'meta': meta}
+            if not entry.get('mcas'):
+                # mca spectra are left to FileSpec when the scan is shown
+                fields['mcas'] = []
+
+            self.cache.put(key, **fields)
@@ -44,6 +44,7 @@ from pyspec.css_logger import log, log_exception
 from pyspec.utils import is_remote_host
 
 from Constants import *
+from Preferences import Preferences
 
 jsonok = False
 try:
@@ -77,6 +78,99 @@ except ImportError:
 
 from DataArrayInfo import DataArrayInfo
 
+def read_shm_rows(specname, varname, begin, end, columnwise=False):
+    """ 
+    Reads rows [begin, end) of a spec shared memory array. A few rows are read 
+    one by one, more than SHM_ROW_READ_MAX rows are sliced from the full array.
+    If columnwise is set, points are stored as columns in the spec array.
+    """
+    if end - begin <= SHM_ROW_READ_MAX:
+        if columnwise:
+            getpoint = spec_shm.getdatacol
+        else:
+            getpoint = spec_shm.getdatarow
+        return np.array([getpoint(specname, varname, ptidx) for ptidx in range(begin, end)])
+
+    data = np.asarray(spec_shm.getdata(specname, varname))
+
+    if columnwise:
+        return np.ascontiguousarray(data[:, begin:end].transpose())
+
+    return np.ascontiguousarray(data[begin:end])
+
+
+class SHMSnapshot(object):
+    """
+    Local copy of the valid rows of a spec shared memory array.
+
+    Only the rows added since the previous update are read from shared memory,
+    together with the last row read before, which spec may have been filling.
+    Rows are written into a back buffer which is then swapped with the front one,
+    so the read-only array given by update() is not modified while it is used
+    (the buffer is only written again two updates later).
+    """
+
+    def __init__(self, specname, varname):
+        self.specname = specname
+        self.varname = varname
+        self.reset()
+
+    def reset(self):
+        self.buffers = [None, None]
+        self.have = [0, 0]     # rows in each buffer that are final
+        self.front = 0
+        self.final = 0         # rows that spec will not modify anymore
+
+    def update(self, nrows):
+        if nrows < self.final:  # new data. start over
+            self.reset()
+
+        final = self.final
+        back = 1 - self.front
+
+        rows = read_shm_rows(self.specname, self.varname, final, nrows)
+
+        if rows.ndim != 2:
+            rows = np.empty((0, self._ncols()))
+
+        ncols = rows.shape[1] if len(rows) else self._ncols()
+
+        buf = self.buffers[back]
+        have = min(self.have[back], final)
+
+        if buf is None or buf.shape[1] != ncols or buf.shape[0] < nrows:
+            capacity = max(BUFFER_MIN_ROWS, nrows)
+            if buf is not None:
+                capacity = max(capacity, 2 * buf.shape[0])
+
+            newbuf = np.empty((capacity, ncols), dtype=np.result_type(rows.dtype, float))
+            if buf is not None and buf.shape[1] == ncols:
+                newbuf[:have] = buf[:have]
+            else:
+                have = 0
+            buf = newbuf
+
+        # final rows that the back buffer missed are taken from the front one
+        if have < final:
+            buf[have:final] = self.buffers[self.front][have:final]
+
+        buf[final:final + len(rows)] = rows
+        nrows = final + len(rows)
+
+        self.buffers[back] = buf
+        self.have[back] = max(nrows - 1, 0)
+        self.final = self.have[back]
+        self.front = back
+
+        view = buf[:nrows]
+        view.flags.writeable = False
+        return view
+
+    def _ncols(self):
+        buf = self.buffers[self.front]
+        return 0 if buf is None else buf.shape[1]
+
+
 class SpecDataConnection(object):
 
     scand_var = "SCAN_D"
@@ -120,6 +214,11 @@ class SpecDataConnection(object):
 
         self.arrayinfo = None
 
+        # opt-in: keep a local copy of scan data and only read new rows from shm
+        self.shm_snapshot = None
+        self.data_is_snapshot = False
+        self.shm_copy_mode = Preferences().getValue("shm_copy_mode", "full")
+
         self.plotconf = None
 
         # server
@@ -203,6 +302,9 @@ class SpecDataConnection(object):
 
         arrinfo = spec_shm.getarrayinfo(specname, self.variable)
         self.arrayinfo = DataArrayInfo( spec_shm.getarrayinfo(specname, self.variable) )
+
+        if self.shm_copy_mode == "rows" and self.shm_snapshot is None:
+            self.shm_snapshot = SHMSnapshot(specname, self.variable)
     
         self.shm_conn_ready = True
         return True
@@ -260,13 +362,18 @@ class SpecDataConnection(object):
         return self.npts + 1
 
     # both
-    def updateData(self):
+    def updateData(self, full=True):
         if self.shm_conn_ready:
             if self.shmdata_updated:
-                self.updateDataSHM()
+                self.updateDataSHM(full)
         elif self.server_conn_ready:
             self.updateDataServer()
 
+    # shm
+    def resetDataSnapshot(self):
+        if self.shm_snapshot is not None:
+            self.shm_snapshot.reset()
+
     def get_data_variable(self, varname):
         # this is the code to get data from variables other
         # than scan data. In fact we should try, when creating those
@@ -276,7 +383,8 @@ class SpecDataConnection(object):
         #    - transfer of data through shm and not socket
         metadata = None
         if self.shm_conn_ready:
-            data = np.array(spec_shm.getdata(self.specname, varname))
+            # getdata already returns a new array. no need to copy it again
+            data = np.asarray(spec_shm.getdata(self.specname, varname))
             metadata = spec_shm.getmetadata(self.specname, varname)
             if metadata:
                 metadata = json.loads(metadata)
@@ -300,10 +408,12 @@ class SpecDataConnection(object):
         # to column number.  Row wise, col wise operation are not supported for now.
         # Still for one dimensional arrays special treatment is necessary.
 
-        self.updateData()
+        # without info, the number of points is found from the full array
+        self.updateData(full=noinfo)
 
         if self.data.any():
-            if self.data.shape[0] == 1:  # Make it column wise if we have only one row
+            # Make it column wise if we have only one row
+            if self.data.shape[0] == 1 and not self.data_is_snapshot:
                 self.data = self.data.transpose()
 
             if self.isImage():
@@ -330,6 +440,15 @@ class SpecDataConnection(object):
             log.log(1,"Wrong connection mode")
             return []
 
+    # shm
+    def getDataPoints(self, begin, end):
+        """ Returns scan data rows [begin, end) as one 2D array """
+        if self.shm_conn_ready:
+            return self.getDataPointsSHM(begin, end)
+        else:
+            log.log(1,"Wrong connection mode")
+            return None
+
     # both
     def getFilePath(self):
         return self.getMeta("datapath")
@@ -397,8 +516,15 @@ class SpecDataConnection(object):
             self.source.updateMeta()
 
     # shm
-    def updateDataSHM(self):
-        self.data = np.array(spec_shm.getdata(self.specname, self.variable))
+    def updateDataSHM(self, full=True):
+        if not full and self.shm_snapshot is not None and self.arrayinfo \
+                and not self.isImage() and self.arrayinfo.getNbRows() > 1:
+            nrows = min(self.npts + 1, self.arrayinfo.getNbRows())
+            self.data = self.shm_snapshot.update(nrows)
+            self.data_is_snapshot = True
+        else:
+            self.data = np.asarray(spec_shm.getdata(self.specname, self.variable))
+            self.data_is_snapshot = False
 
     # shm
     def getDataPointSHM(self, ptidx):
@@ -407,6 +533,17 @@ class SpecDataConnection(object):
         else:
             return np.array(spec_shm.getdatarow(self.specname, self.variable, ptidx))
 
+    # shm
+    def getDataPointsSHM(self, begin, end):
+        begin = max(int(begin), 0)
+        end = int(end)
+
+        if end <= begin:
+            return None
+
+        columnwise = self.data is not None and self.data.ndim == 2 and self.data.shape[1] == 1
+        return read_shm_rows(self.specname, self.variable, begin, end, columnwise)
+
     # shm 
     def updateInfo(self):
 
@@ -126,6 +126,9 @@ class SpecDataSource(DataSource1D):
 
         self.datablock.subscribe(self, X_SELECTION_CHANGED, self._updateFollowMotor)
 
+        # live data: merge data/stats updates arriving within one event loop turn
+        self.datablock.setCoalescing(True)
+
         self.specValue.setText(specname)
         self.plot_w.showSourceStatus()
         self.plot_w.setServerStatus(STATUS_OFF)
@@ -820,6 +823,9 @@ class SpecDataSource(DataSource1D):
 
         self.setScanObject(scan)
 
+        # rows kept from the previous scan are not valid anymore
+        self.specConn.resetDataSnapshot()
+
         # First scan
         if not self.initOk:
             # scan is new but data may exist
@@ -975,34 +981,46 @@ class SpecDataSource(DataSource1D):
         self.last_pt_added = last
 
         if (points is not None) and points.any():
-            self.datablock.addPoints(points.tolist())
+            self.datablock.addPoints(points)
             self.checkRaise()
 
         self.meta_widget.setPoints(self.last_pt_added)
 
     # shm
     def _getDataPoints(self, begin, end):
-        ptidx = begin
+        # rows [begin, end) are read in one go from spec shared memory
+        try:
+            pointdata = self.specConn.getDataPoints(begin, end)
+        except:
+            import traceback
+            debugmsg = traceback.format_exc()
+            log.log(1,"cannot read points. reading them one by one")
+            log.log(3,debugmsg)
+            return self._getDataPointsByRow(begin, end)
 
-        pointno = 0
-        pointdata = None
+        if pointdata is None or not len(pointdata):
+            return None
 
-        while ptidx < end:
+        return pointdata
+
+    def _getDataPointsByRow(self, begin, end):
+        # keeps the rows read before a failure
+        points = []
+
+        for ptidx in range(begin, end):
             try:
-                point = self.specConn.getDataPoint(ptidx)
-                if pointno:
-                    pointdata = np.vstack((pointdata, point))
-                else:
-                    pointdata = point
-                pointno += 1
+                points.append(self.specConn.getDataPoint(ptidx))
             except:
                 import traceback
                 debugmsg = traceback.format_exc()
                 log.log(1,"cannot read point")
                 log.log(3,debugmsg)
                 break
-            ptidx += 1
-        return pointdata
+
+        if not points:
+            return None
+
+        return np.vstack(points)
 
     # server
     def updateMotorTable(self):
@@ -0,0 +1,629 @@
+#******************************************************************************
+#
+#  @(#)SpecFileIndex.py	1.1  10/18/26 CSS
+#
+#  "splot" Release 3
+#
+#  Copyright (c) 2026
+#  by Certified Scientific Software.
+#  All rights reserved.
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a
+#  copy of this software ("splot") and associated documentation files (the
+#  "Software"), to deal in the Software without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so, subject to
+#  the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included
+#  in all copies or substantial portions of the Software.
+#
+#  Neither the name of the copyright holder nor the names of its contributors
+#  may be used to endorse or promote products derived from this software
+#  without specific prior written permission.
+#
+#     * The software is provided "as is", without warranty of any   *
+#     * kind, express or implied, including but not limited to the  *
+#     * warranties of merchantability, fitness for a particular     *
+#     * purpose and noninfringement.  In no event shall the authors *
+#     * or copyright holders be liable for any claim, damages or    *
+#     * other liability, whether in an action of contract, tort     *
+#     * or otherwise, arising from, out of or in connection with    *
+#     * the software or the use of other dealings in the software.  *
+#
+#******************************************************************************
+
+
+"""
+This module keeps an index of the scans in a SPEC data file.
+
+For every scan the index holds its number, command, byte offset and length 
+in the file, the #L labels, the number of data points and of mca spectra and
+the offset of the file header (#E block) the scan belongs to.  The index is 
+built in a background thread and saved in the splot preferences directory, 
+keyed by the file path, size and modification time, so that a file
+that was already opened does not need to be read again.  When a file grows,
+indexing continues from the last scan found.
+
+read_scan_data() uses the index to parse the data block of one scan 
+directly from the memory-mapped file. read_scan_header() and read_file_header()
+read the scan and file header lines in the same way.
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import hashlib
+import threading
+
+import numpy as np
+
+from pyspec.css_logger import log
+
+from Preferences import Preferences
+
+INDEX_VERSION = 2
+INDEX_DIRNAME = "scanindex"
+
+# header lines are looked for in this many bytes from the header start
+HEADER_MAX_BYTES = 65536
+
+class SpecFileIndex(object):
+
+    def __init__(self, filename):
+        self.filename = os.path.realpath(filename)
+
+        self.entries = []
+        self.size = 0
+        self.mtime = 0
+
+        self.lock = threading.Lock()
+        self.indexer = None
+
+        self.cachefile = self._cacheFileName()
+        self.loadCache()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def getEntries(self, first=0):
+        with self.lock:
+            return self.entries[first:]
+
+    def getEntry(self, idx):
+        with self.lock:
+            try:
+                return self.entries[idx]
+            except IndexError:
+                return None
+
+    def getOrder(self, idx):
+        """ Number of scans with the same number up to scan idx (1 for the first one) """
+        with self.lock:
+            number = self.entries[idx]['number']
+            return sum(1 for entry in self.entries[:idx + 1] if entry['number'] == number)
+
+    def getNumberHeaders(self):
+        with self.lock:
+            return len(set(entry.get('header') for entry in self.entries))
+
+    def isBuilding(self):
+        return self.indexer is not None and self.indexer.is_alive()
+
+    def isUpToDate(self):
+        try:
+            st = os.stat(self.filename)
+        except OSError:
+            return True
+        return st.st_size == self.size and st.st_mtime == self.mtime
+
+    def update(self):
+        """ Starts indexing in the background if the file changed since last indexed """
+        if self.isBuilding() or self.isUpToDate():
+            return False
+
+        self.indexer = ScanIndexer(self)
+        self.indexer.start()
+        return True
+
+    def stop(self):
+        if self.indexer is not None:
+            self.indexer.request_stop()
+
+    def _resumeOffset(self, size):
+        """ 
+        Returns the offset to continue indexing from. The last scan is indexed again
+        as it may not have been complete.
+        """
+        with self.lock:
+            if size < self.size or not self.entries:
+                self.entries = []
+                return 0
+            return self.entries[-1]['offset']
+
+    def _resumeHeader(self, offset):
+        # file header of the scan indexing continues from
+        with self.lock:
+            if offset == 0 or not self.entries:
+                return None
+            return self.entries[-1].get('header')
+
+    def _checkResume(self, mm, offset):
+        """ Verifies the file still has the last indexed scan at offset. Otherwise index from start """
+        if offset == 0:
+            return 0
+
+        with self.lock:
+            number = self.entries[-1]['number']
+            if mm[offset:offset + 40].startswith(b"#S %d " % number):
+                return offset
+            self.entries = []
+            return 0
+
+    def _addEntry(self, entry):
+        with self.lock:
+            if self.entries and self.entries[-1]['offset'] == entry['offset']:
+                self.entries[-1] = entry
+            else:
+                self.entries.append(entry)
+
+    def _setIndexed(self, size, mtime):
+        self.size = size
+        self.mtime = mtime
+        self.saveCache()
+
+    # cache
+    def _cacheFileName(self):
+        splotdir = Preferences().splotdir
+        key = hashlib.sha1(self.filename.encode('utf-8')).hexdigest()
+        return os.path.join(splotdir, INDEX_DIRNAME, key + ".json")
+
+    def loadCache(self):
+        if not os.path.exists(self.cachefile):
+            return False
+
+        try:
+            with open(self.cachefile) as fd:
+                cache = json.load(fd)
+        except (OSError, ValueError):
+            log.log(2, "cannot read scan index cache %s" % self.cachefile)
+            return False
+
+        if cache.get('version') != INDEX_VERSION or cache.get('path') != self.filename:
+            return False
+
+        self.entries = cache['entries']
+        self.size = cache['size']
+        self.mtime = cache['mtime']
+        return True
+
+    def saveCache(self):
+        cachedir = os.path.dirname(self.cachefile)
+
+        cache = {'version': INDEX_VERSION,
+                 'path': self.filename,
+                 'size': self.size,
+                 'mtime': self.mtime,
+                 'entries': self.getEntries()}
+
+        try:
+            if not os.path.isdir(cachedir):
+                os.makedirs(cachedir)
+            tmpfile = self.cachefile + ".tmp"
+            with open(tmpfile, "w") as fd:
+                json.dump(cache, fd)
+            os.replace(tmpfile, self.cachefile)
+        except OSError:
+            log.log(2, "cannot save scan index cache %s" % self.cachefile)
+
+
+class ScanIndexer(threading.Thread):
+
+    def __init__(self, index, *args):
+        self.index = index
+        self.stop_it = False
+        threading.Thread.__init__(self, *args)
+        self.daemon = True
+
+    def request_stop(self):
+        self.stop_it = True
+
+    def run(self):
+        filename = self.index.filename
+
+        try:
+            st = os.stat(filename)
+            size = st.st_size
+
+            offset = self.index._resumeOffset(size)
+
+            if size > 0:
+                with open(filename, "rb") as fd:
+                    mm = mmap.mmap(fd.fileno(), size, access=mmap.ACCESS_READ)
+                    try:
+                        offset = self.index._checkResume(mm, offset)
+                        header = self.index._resumeHeader(offset)
+                        for entry in iter_scan_blocks(mm, offset, size, header):
+                            if self.stop_it:
+                                return
+                            self.index._addEntry(entry)
+                    finally:
+                        mm.close()
+
+            self.index._setIndexed(size, st.st_mtime)
+        except:
+            import traceback
+            log.log(2, "error indexing file %s" % filename)
+            log.log(2, traceback.format_exc())
+
+
+def find_file_header(mm, start, end):
+    """ Offset of the last file header (#E line) in mm[start:end]. None if there is none """
+    if mm[start:start+3] == b"#E ":
+        found = start
+    else:
+        found = None
+
+    pos = mm.rfind(b"\n#E ", start, end)
+    if pos != -1:
+        found = pos + 1
+
+    return found
+
+
+def iter_scan_blocks(mm, offset, size, header=None):
+    """ 
+    Yields an index entry for every scan (#S line) in mm[offset:size]. header is
+    the offset of the file header in effect at offset
+    """
+
+    if mm[offset:offset+3] == b"#S ":
+        start = offset
+    else:
+        start = mm.find(b"\n#S ", offset, size)
+        if start == -1:
+            return
+        start += 1
+
+    found = find_file_header(mm, offset, start)
+    if found is not None:
+        header = found
+
+    while start != -1:
+        nxt = mm.find(b"\n#S ", start, size)
+
+        if nxt == -1:
+            end = size
+        else:
+            end = nxt + 1
+
+        entry = parse_scan_block(mm[start:end], start)
+        if entry is not None:
+            entry['header'] = header
+            yield entry
+
+        # a new file header after the scan applies to the next ones
+        found = find_file_header(mm, start + 1, end)
+        if found is not None:
+            header = found
+
+        start = end if nxt != -1 else -1
+
+
+def parse_scan_block(block, offset):
+    """ 
+    Returns the index entry for the scan in block, which starts at its #S line.
+    Data lines are counted skipping comments and @A (mca) lines with their continuation lines.
+    """
+    lines = block.split(b"\n")
+
+    parts = lines[0][3:].strip().split(None, 1)
+
+    try:
+        number = int(parts[0])
+    except (IndexError, ValueError):
+        return None
+
+    command = parts[1].decode('latin-1').strip() if len(parts) > 1 else ""
+
+    labels = []
+    npts = 0
+    nmcas = 0
+    data_offset = None
+
+    pos = 0
+    continued = False
+
+    for line in lines:
+        linelen = len(line) + 1
+        line = line.rstrip(b"\r")
+
+        if continued:
+            continued = line.endswith(b"\\")
+        elif line.startswith(b"#L "):
+            labels = [lbl.strip() for lbl in line[3:].decode('latin-1').split("  ") if lbl.strip()]
+            data_offset = offset + pos + linelen
+        elif line.startswith(b"@"):
+            if line.startswith(b"@A"):
+                nmcas += 1
+            continued = line.endswith(b"\\")
+        elif line.strip() and not line.startswith(b"#"):
+            npts += 1
+
+        pos += linelen
+
+    return {'number': number,
+            'command': command,
+            'offset': offset,
+            'length': len(block),
+            'data_offset': data_offset,
+            'labels': labels,
+            'npts': npts,
+            'mcas': nmcas}
+
+
+def read_scan_data(filename, entry):
+    """
+    Reads the data points of the scan described by index entry from the file.
+    Returns a 2D array (points x columns) or None if data cannot be parsed 
+    this way (the caller should then use the FileSpec scan).
+    """
+    data_offset = entry.get('data_offset')
+    if data_offset is None:
+        return None
+
+    with open(filename, "rb") as fd:
+        size = os.fstat(fd.fileno()).st_size
+        if data_offset > size:
+            return None
+
+        if data_offset == size:
+            block = b""
+        else:
+            mm = mmap.mmap(fd.fileno(), size, access=mmap.ACCESS_READ)
+            try:
+                # look for the end of the block. the scan may have grown since indexed
+                end = mm.find(b"\n#S ", data_offset)
+                if end == -1:
+                    end = size
+                block = mm[data_offset:end]
+            finally:
+                mm.close()
+
+    return parse_data_block(block, len(entry.get('labels') or []))
+
+
+def _read_lines(filename, offset, length):
+    with open(filename, "rb") as fd:
+        fd.seek(offset)
+        block = fd.read(length)
+    return [line.rstrip(b"\r").decode('latin-1') for line in block.split(b"\n")]
+
+
+def _split_names(value):
+    # names in #O, #J (and #L) lines are separated by two spaces
+    return [name.strip() for name in value.split("  ") if name.strip()]
+
+
+def read_file_header(filename, offset):
+    """
+    Returns the fields of the file header at offset (its #E line): epoch, date,
+    comments, user lines and names and mnemonics of motors and counters.
+    """
+    header = {'epoch': None, 'date': None, 'comments': [], 'userlines': [],
+              'motornames': [], 'motormnes': [], 'counternames': [], 'countermnes': []}
+
+    if offset is None:
+        return header
+
+    for line in _read_lines(filename, offset, HEADER_MAX_BYTES):
+        if not line.startswith("#") or line.startswith("#S "):
+            break
+
+        key, _sep, value = line.partition(" ")
+
+        if key == "#E":
+            header['epoch'] = value.strip()
+        elif key == "#D":
+            header['date'] = value.strip()
+        elif key == "#C":
+            header['comments'].append(value.strip())
+        elif key == "#U":
+            header['userlines'].append(value.strip())
+        elif key.startswith("#O"):
+            header['motornames'].extend(_split_names(value))
+        elif key.startswith("#o"):
+            header['motormnes'].extend(value.split())
+        elif key.startswith("#J"):
+            header['counternames'].extend(_split_names(value))
+        elif key.startswith("#j"):
+            header['countermnes'].extend(value.split())
+
+    return header
+
+
+def read_scan_header(filename, entry, fileheader=None):
+    """
+    Returns the metadata in the header lines of the scan described by index
+    entry (the lines before its data). Motor positions are named after the
+    file header (see read_file_header).
+    """
+    if fileheader is None:
+        fileheader = read_file_header(filename, entry.get('header'))
+
+    end = entry.get('data_offset') or entry['offset'] + entry['length']
+    length = min(end - entry['offset'], HEADER_MAX_BYTES)
+
+    meta = {'date': None, 'HKL': None, 'comments': [], 'userlines': [],
+            'geo': [], 'extra': [], 'errors': []}
+    positions = []
+
+    for line in _read_lines(filename, entry['offset'], length):
+        if not line.startswith("#"):
+            continue
+
+        key, _sep, value = line.partition(" ")
+
+        if key in ("#S", "#L", "#N"):
+            continue
+        elif key == "#D":
+            meta['date'] = value.strip()
+        elif key == "#Q":
+            meta['HKL'] = value.strip()
+        elif key == "#C":
+            meta['comments'].append(value.strip())
+        elif key == "#U":
+            meta['userlines'].append(value.strip())
+        elif key.startswith("#G"):
+            meta['geo'].append(line)
+        elif key.startswith("#P"):
+            positions.extend(value.split())
+        else:
+            meta['extra'].append(line)
+
+    names = fileheader['motornames']
+    meta['motornames'] = names
+    meta['motormnes'] = fileheader['motormnes']
+    meta['motors'] = list(zip(names, positions))
+    meta['counternames'] = fileheader['counternames']
+    meta['countermnes'] = fileheader['countermnes']
+
+    meta['points'] = entry['npts']
+    meta['columns'] = len(entry.get('labels') or [])
+
+    return meta
+
+
+def data_line_mask(buf, starts, ends):
+    """
+    Returns a boolean mask with the lines in buf (delimited by starts, ends) that
+    are data lines. Comments, empty lines, @A (mca) lines and their continuation
+    lines are masked out.
+    """
+    nlines = len(starts)
+    nonempty = ends > starts
+
+    first = np.zeros(nlines, dtype=np.uint8)
+    first[nonempty] = buf[starts[nonempty]]
+
+    last = np.zeros(nlines, dtype=np.uint8)
+    last[nonempty] = buf[ends[nonempty] - 1]
+
+    continues = np.zeros(nlines, dtype=bool)
+    continues[1:] = (last[:-1] == ord("\\"))
+
+    is_space = (first == ord(" ")) | (first == ord("\t"))
+
+    mask = nonempty & ~continues & (first != ord("#")) & (first != ord("@"))
+
+    # lines starting with blanks may still be empty
+    for lineno in np.flatnonzero(mask & is_space):
+        if not bytes(buf[starts[lineno]:ends[lineno]]).strip():
+            mask[lineno] = False
+
+    return mask
+
+
+def parse_data_block(block, ncols=0):
+    """ Parses the numeric rows of a scan data block (text following the #L line) """
+
+    if not block:
+        return np.empty((0, ncols))
+
+    buf = np.frombuffer(block, dtype=np.uint8)
+
+    newlines = np.flatnonzero(buf == ord("\n"))
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [len(buf)]))
+
+    # do not count carriage returns as part of the line
+    crlf = (ends > starts)
+    crlf[crlf] = buf[ends[crlf] - 1] == ord("\r")
+    ends = ends - crlf
+
+    mask = data_line_mask(buf, starts, ends)
+
+    if not mask.any():
+        return np.empty((0, ncols))
+
+    lines = np.flatnonzero(mask)
+
+    if lines[-1] - lines[0] + 1 == len(lines):
+        # data lines are contiguous. parse the block directly
+        text = block[starts[lines[0]]:ends[lines[-1]]]
+    else:
+        text = b"\n".join([block[starts[idx]:ends[idx]] for idx in lines])
+
+    # labels and columns may not match. use the number of values in the first point
+    ncols = len(block[starts[lines[0]]:ends[lines[0]]].split())
+
+    nrows = len(lines)
+
+    values = np.fromstring(text.decode('latin-1'), dtype=float, sep=" ")
+
+    if len(values) != nrows * ncols:
+        log.log(3, "irregular data block. parsing it line by line")
+        rows = []
+        for idx in lines:
+            row = block[starts[idx]:ends[idx]].split()
+            if len(row) == ncols:
+                try:
+                    rows.append([float(val) for val in row])
+                except ValueError:
+                    pass
+        return np.array(rows).reshape((len(rows), ncols))
+
+    return values.reshape((nrows, ncols))
+
+
+def benchmark(filename, nscans=None):
+    """ Compares FileSpec getData() with read_scan_data() for the scans in filename """
+    from pyspec.file.spec import FileSpec
+
+    index = SpecFileIndex(filename)
+    if index.update():
+        index.indexer.join()
+
+    sf = FileSpec(filename)
+
+    entries = index.getEntries()
+    if nscans:
+        entries = entries[-nscans:]
+
+    tfs = tmm = 0
+    npts = 0
+
+    for entry in entries:
+        scanidx = index.entries.index(entry)
+        scan = sf[scanidx]
+
+        t0 = time.time()
+        fsdata = scan.getData()
+        t1 = time.time()
+        mmdata = read_scan_data(index.filename, entry)
+        t2 = time.time()
+
+        tfs += t1 - t0
+        tmm += t2 - t1
+        npts += len(fsdata)
+
+        if mmdata is None or mmdata.shape != fsdata.shape or not np.allclose(mmdata, fsdata, equal_nan=True):
+            print("scan %s: data differs" % entry['number'])
+
+    print("%d scans, %d points" % (len(entries), npts))
+    print("  FileSpec:  %.3f secs" % tfs)
+    print("  mmap:      %.3f secs" % tmm)
+    if tmm:
+        print("  speedup:   %.1fx" % (tfs / tmm))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: %s specfile [nscans]" % sys.argv[0])
+        sys.exit(0)
+
+    nscans = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    benchmark(sys.argv[1], nscans)
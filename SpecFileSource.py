@@ -38,6 +38,13 @@ import os
 import sys
 import time
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from concurrent.futures import ThreadPoolExecutor
+
 from pyspec.file.spec import FileSpec
 from pyspec.graphics.QVariant import *
 from pyspec.graphics import qt_variant
@@ -48,6 +55,10 @@ from icons import get_icon
 from Constants import *
 from Scan import Scan
 from DataSource1D import DataSource1D
+from SpecFileIndex import SpecFileIndex, read_scan_data, read_scan_header, read_file_header
+from SpecFileTail import SpecFileTail
+from ScanCache import ScanCache, ScanPrefetcher
+from Preferences import Preferences
 
 class SpecFileSource(DataSource1D):
 
@@ -61,7 +72,8 @@ class SpecFileSource(DataSource1D):
         super(SpecFileSource, self).__init__(
             app, SOURCE_FILE, os.path.basename(self.filename))
 
-        self.nb_scans = 0
+        self.nb_scans = 0        # scans in tree
+        self.nb_file_scans = 0   # scans in file at last update
 
         self.spec_connection = None
         self.spec_name = None
@@ -76,13 +88,13 @@ class SpecFileSource(DataSource1D):
         return "file"
 
     def getDescription(self):
-        scannum = self.currentScan.getNumber()
+        scannum = self.currentScan['number']
         return "%s_s%s" % (self.getSourceName(), scannum)
 
     def init(self):
         DataSource1D.init(self)
         self.scanselected = None
-        self.currentScan = None
+        self.currentScan = None   # index entry of the selected scan
 
     def init_widget(self):
 
@@ -270,31 +282,65 @@ class SpecFileSource(DataSource1D):
 
     def setFile(self, filename=None, fd=None):
 
-        if fd is not None:
-            self.sf = fd
-        else:
-            if filename == "/dev/null":
-                return False
-
-            try:
-                self.sf = FileSpec(filename)
-            except BaseException as e:
-                log.log(2, "----- error opening file %s" % str(e))
-                raise e
+        # the file is only parsed by FileSpec when a scan needs it (see _fileSpec)
+        self.sf = fd
 
-        filename = self.sf.getFileName()
+        if fd is not None:
+            filename = fd.getFileName()
+        elif filename == "/dev/null":
+            return False
+        elif not os.path.isfile(filename):
+            log.log(2, "----- error opening file %s" % filename)
+            raise IOError("cannot open file %s" % filename)
 
         self.name = str(filename)
         self.fileNameLabel.setText(os.path.basename(str(filename)))
 
         self.treeItems = []
+
+        # scan tree is filled from the scan index, built in background
+        self.scanindex = SpecFileIndex(str(filename))
+        self.indexTimer = QTimer()
+        self.indexTimer.timeout.connect(self._fillTreeFromIndex)
+
+        # parsed scans. neighbours of the selected scan are loaded in background
+        try:
+            budget = int(Preferences().getValue("scan_cache_mb", SCAN_CACHE_MB))
+        except ValueError:
+            budget = SCAN_CACHE_MB
+        self.scancache = ScanCache(budget * 1024 * 1024)
+        self.prefetcher = ScanPrefetcher(self.scanindex.filename, self.scancache)
+        self.prefetcher.start()
+
+        # overlay of selected scans
+        try:
+            workers = int(Preferences().getValue("overlay_workers", OVERLAY_MAX_WORKERS))
+        except ValueError:
+            workers = OVERLAY_MAX_WORKERS
+        self.overlayPool = ThreadPoolExecutor(max_workers=max(workers, 1))
+        self.overlayFutures = []
+        self.overlayResults = queue.Queue()
+        self.overlay_generation = 0
+        self.overlayTimer = QTimer()
+        self.overlayTimer.timeout.connect(self._addOverlayCurves)
+
+        # follow the last scan while it grows
+        self.tail = SpecFileTail(self.scanindex.filename)
+
         self._updateFile()
 
-        self._updateFileInfo()
+        # be notified when the file is modified (inotify on linux). keep polling
+        # as a fallback, as notifications may not arrive (e.g. network filesystems)
+        self.watcher = QFileSystemWatcher()
+        if self.watcher.addPath(self.scanindex.filename):
+            self.watcher.fileChanged.connect(self._fileChanged)
+            interval = UPDATEFILE_INTERVAL_WATCHED
+        else:
+            interval = UPDATEFILE_INTERVAL
 
         self.timer = QTimer()
         self.timer.timeout.connect(self.updateFile)
-        self.timer.start(UPDATEFILE_INTERVAL)
+        self.timer.start(interval)
 
     def set_spec_connection(self, conn):
         self.spec_connection = conn
@@ -320,10 +366,10 @@ class SpecFileSource(DataSource1D):
         self.infoBox.setColumnCount(2)
         self.infoBox.setRootIsDecorated(False)
 
-        created, modified, user, spec = self.sf.getInfo()
-        nb_scans = self.sf.getNumberScans()
-        nb_headers = self.sf.getNumberHeaders()
-        fullpath = self.sf.absolutePath()
+        created, modified, user, spec = self._fileInfo()
+        nb_scans = len(self.scanindex)
+        nb_headers = self.scanindex.getNumberHeaders()
+        fullpath = self.scanindex.filename
 
         if user:
             item = QTreeWidgetItem(["User", user])
@@ -356,6 +402,47 @@ class SpecFileSource(DataSource1D):
 
         self.infoBox.resizeColumnToContents(0)
 
+    def _fileInfo(self):
+        """ created, modified, user and spec name, from the first file header """
+        entry = self.scanindex.getEntry(0)
+        header = read_file_header(self.scanindex.filename, entry and entry.get('header'))
+
+        created = header['date']
+        try:
+            modified = time.ctime(os.path.getmtime(self.scanindex.filename))
+        except OSError:
+            modified = None
+
+        # first comment is like "fourc  User = specadm"
+        user = spec = None
+        if header['comments']:
+            comment = header['comments'][0]
+            if "User =" in comment:
+                spec, user = [part.strip() for part in comment.split("User =", 1)]
+            else:
+                spec = comment.split()[0] if comment.split() else None
+
+        return created, modified, user, spec
+
+    def _fileSpec(self):
+        """ The file parsed by FileSpec. Only built when a scan needs it (mca spectra) """
+        if self.sf is None:
+            self.sf = FileSpec(self.scanindex.filename)
+        else:
+            self.sf.update()
+        return self.sf
+
+    def _scanMeta(self, scanno, entry, record):
+        scanmeta = {
+            'title':          "Scan %d - %s" % (entry['number'], entry['command']),
+            'command':        entry['command'],
+            'scanno':         entry['number'],
+            'order':          self.scanindex.getOrder(scanno),
+            'noinfile':       scanno + 1,
+        }
+        scanmeta.update(record['meta'])
+        return scanmeta
+
     def peyPressEvent(self, e):
         if e.key() == Qt.Key_Up:
             self.prev()
@@ -369,36 +456,113 @@ class SpecFileSource(DataSource1D):
     def close(self):
         super(SpecFileSource, self).close()
         self.timer.stop()
+        self.watcher.removePaths(self.watcher.files())
+        self.tail.stop()
+        self.indexTimer.stop()
+        self.scanindex.stop()
+        self.prefetcher.request_stop()
+        self._cancelOverlays()
+        self.overlayPool.shutdown(wait=False)
+        self.scancache.clear()
 
     def addScansToTree(self, first=0):
         sn = first
-        for scan in self.sf[first:]:
-            no = str(scan.getNumber())
-            cmd = scan.getCommand()
-            #item = QTreeWidgetItem(['', str(scan)])
+        for entry in self.scanindex.getEntries(first):
+            no = str(entry['number'])
+            cmd = entry['command']
             item = QTreeWidgetItem([no,cmd])
             self.treeItems.append(item)
             self.scantree.addTopLevelItem(item)
             sn += 1
         return sn
 
+    def _fillTreeFromIndex(self):
+        if len(self.scanindex) < self.nb_scans:  # file was rewritten
+            self.scantree.clear()
+            self.treeItems = []
+            self.nb_scans = 0
+
+        if len(self.scanindex) > self.nb_scans:
+            self.nb_scans = self.addScansToTree(self.nb_scans)
+            self.scantree.resizeColumnToContents(0)
+            self._syncCurrentItem()
+
+        if not self.scanindex.isBuilding():
+            self.indexTimer.stop()
+            self._indexUpdated()
+
+    def _syncCurrentItem(self):
+        # the selected scan may have been loaded before its tree item was there
+        scanno = self.scanselected
+        if scanno is None or scanno >= len(self.treeItems):
+            return
+
+        item = self.treeItems[scanno]
+        if self.scantree.currentItem() is not item:
+            self.scantree.blockSignals(True)
+            self.scantree.setCurrentItem(item)
+            self.scantree.blockSignals(False)
+
+    def _fileChanged(self, path):
+        # the path is dropped from the watcher if the file is replaced
+        if path not in self.watcher.files() and os.path.exists(path):
+            self.watcher.addPath(path)
+        self.updateFile()
+
     def updateFile(self):
-        if self.sf.update():
+        if not self.scanindex.isUpToDate():
             self._updateFile()
 
     def _updateFile(self):
-        if self.scanselected is None or self.scanselected == self.nb_scans - 1:
+        # scans are counted, listed and selected when the index is up to date
+        if self.scanindex.update():
+            self.indexTimer.start(INDEX_POLL_INTERVAL)
+
+        self._fillTreeFromIndex()
+
+    def _indexUpdated(self):
+        if self.scanselected is None or self.scanselected == self.nb_file_scans - 1:
             autoselect = 1
         else:
             autoselect = 0
 
-        if len(self.sf) > self.nb_scans:
-            self.nb_scans = self.addScansToTree(self.nb_scans)
+        nb_scans = len(self.scanindex)
+        newscans = (nb_scans != self.nb_file_scans)
+        self.nb_file_scans = nb_scans
 
-        if autoselect and len(self.sf) > 0:
-            self.selectScan(-1, force=True)
+        self._updateFileInfo()
 
-        self.scantree.resizeColumnToContents(0)
+        if autoselect and nb_scans > 0:
+            # only new points were written to the selected scan. append them
+            if newscans or not self._readTail():
+                self.selectScan(-1, force=True)
+
+    def _readTail(self):
+        """ Appends the points written to the followed scan. Returns False if it must be read again """
+        if self.currentScan is None or not self.tail.isFollowing(self.currentScan['number']):
+            return False
+
+        rows, newscan = self.tail.read()
+        if rows is None or newscan:
+            return False
+
+        if len(rows):
+            self.datablock.addPoints(rows)
+
+        return True
+
+    def _followTail(self, scanno, data):
+        # only the last scan in the file may grow
+        self.tail.stop()
+
+        if scanno != len(self.scanindex) - 1 or getattr(data, 'ndim', 0) != 2:
+            return
+
+        entry = self.scanindex.getEntry(scanno)
+        if entry is None or entry is not self.currentScan:
+            return
+
+        self.tail.follow(entry, data.shape[0], data.shape[1])
 
     def treeClicked(self, item, column):
         # TODO. is this really necessary? It should be active (visible) 
@@ -416,6 +580,8 @@ class SpecFileSource(DataSource1D):
             log.log(3, "No scans selected")
             return
 
+        self.tail.stop()
+
         # Clear existing curves
         if hasattr(self.plot, "curves"):
             self.plot.curves.clear()
@@ -423,18 +589,14 @@ class SpecFileSource(DataSource1D):
         # --- update metadata for primary scan WITHOUT resetting selection
         primary_scanno = selected_indices[0]
         try:
-            scan = self.sf[primary_scanno]
-            self.currentScan = scan
+            entry = self.scanindex.getEntry(primary_scanno)
+            self.currentScan = entry
             self.scanselected = primary_scanno
 
-            data = scan.getData()
-            labels = scan.getLabels()
-            scanmeta = {
-                'title': f"Scan {scan.getNumber()} - {scan.getCommand()}",
-                'command': scan.getCommand(),
-                'scanno': scan.getNumber(),
-            }
-            scanmeta.update(scan.getMeta())
+            record = self._readScan(primary_scanno, entry)
+            data = record['data']
+            labels = record['labels']
+            scanmeta = self._scanMeta(primary_scanno, entry, record)
 
             self.metadata = {}
             self.metadata.update(scanmeta)
@@ -447,53 +609,131 @@ class SpecFileSource(DataSource1D):
             log.log(2, f"Error setting primary scan metadata: {e}")
             log.log(2, traceback.format_exc())
 
-        # --- plot all selected scans (overlay)
-        # --- plot all selected scans (overlay)
+        # --- plot all selected scans (overlay). scans are loaded by a pool of
+        #     workers and curves added as they arrive
+        self._loadOverlays(selected_indices)
+
+    def _loadOverlays(self, selected_indices):
+        self._cancelOverlays()
+        generation = self.overlay_generation
+
         for scanno in selected_indices:
+            key, entry = self._cacheKey(scanno)
+            record = self.scancache.get(key) if key is not None else None
+
+            if entry is None:
+                continue
+
+            if record is not None and record.get('data') is not None:
+                # already parsed. load it here
+                try:
+                    record = self._readScan(scanno, entry)
+                    self.overlayResults.put((generation, entry['number'], entry['command'],
+                                             record['labels'], record['data']))
+                except Exception as e:
+                    import traceback
+                    log.log(2, f"Error overlaying scan {scanno}: {e}")
+                    log.log(2, traceback.format_exc())
+            else:
+                future = self.overlayPool.submit(self._loadOverlayScan, generation, key, entry)
+                self.overlayFutures.append(future)
+
+        self._addOverlayCurves()
+        if self.overlayFutures:
+            self.overlayTimer.start(OVERLAY_POLL_INTERVAL)
+
+    def _cancelOverlays(self):
+        self.overlay_generation += 1
+
+        for future in self.overlayFutures:
+            future.cancel()
+        self.overlayFutures = []
+
+        self.overlayTimer.stop()
+
+    def _loadOverlayScan(self, generation, key, entry):
+        # runs in a worker thread
+        if generation != self.overlay_generation:
+            return
+
+        try:
+            data = read_scan_data(self.scanindex.filename, entry)
+        except:
+            import traceback
+            log.log(2, "Error overlaying scan %s" % entry['number'])
+            log.log(2, traceback.format_exc())
+            return
+
+        if data is None:
+            return
+
+        if key is not None:
+            self.scancache.put(key, data=data)
+
+        self.overlayResults.put((generation, entry['number'], entry['command'], entry['labels'], data))
+
+    def _addOverlayCurves(self):
+        added = False
+
+        while True:
             try:
-                scan = self.sf[scanno]
-                data = scan.getData()
-                labels = scan.getLabels()
-                num = scan.getNumber()
-                cmd = scan.getCommand()
-
-                if not data.any() or len(labels) < 2:
-                    continue
-
-                # X column is always the first
-                x = data[:, 0]
-
-                # Match the same detector logic as selectScan()
-                det_labels = [lbl for lbl in labels if "det" in lbl.lower()]
-                if not det_labels:
-                    det_labels = [lbl for lbl in labels if "count" in lbl.lower()]
-                if not det_labels:
-                    det_labels = [lbl for lbl in labels if "mon" not in lbl.lower() and "sec" not in lbl.lower()]
-                if not det_labels:
-                    det_labels = [labels[-1]]
-
-                y_label = det_labels[0]
-                y_index = labels.index(y_label)
-                y = data[:, y_index]
-
-                curve_name = f"scan{num}_{y_label}"
-                self.plot.addCurve(curve_name)
-                curve = self.plot.curves[curve_name]
-
-                curve._x = x
-                curve._y = y
-                curve.attach()
-                curve.setColor(self.plot.colorTable.getColor(curve_name))
-                curve.mne = f"Scan {num}: {cmd}"
+                generation, num, cmd, labels, data = self.overlayResults.get_nowait()
+            except queue.Empty:
+                break
+
+            if generation != self.overlay_generation:  # selection changed since
+                continue
 
+            try:
+                added = self._addOverlayCurve(num, cmd, labels, data) or added
             except Exception as e:
                 import traceback
-                log.log(2, f"Error overlaying scan {scanno}: {e}")
+                log.log(2, f"Error overlaying scan {num}: {e}")
                 log.log(2, traceback.format_exc())
-                
-        # Force redraw
-        self.plot.queue_replot()
 
+        self.overlayFutures = [future for future in self.overlayFutures if not future.done()]
+
+        if not self.overlayFutures and self.overlayResults.empty():
+            self.overlayTimer.stop()
+
+        if added:
+            # Force redraw
+            self.plot.queue_replot()
+
+    def _addOverlayCurve(self, num, cmd, labels, data):
+
+        if not data.any() or len(labels) < 2:
+            return False
+
+        # X column is always the first
+        x = data[:, 0]
+
+        # Match the same detector logic as selectScan()
+        det_labels = [lbl for lbl in labels if "det" in lbl.lower()]
+        if not det_labels:
+            det_labels = [lbl for lbl in labels if "count" in lbl.lower()]
+        if not det_labels:
+            det_labels = [lbl for lbl in labels if "mon" not in lbl.lower() and "sec" not in lbl.lower()]
+        if not det_labels:
+            det_labels = [labels[-1]]
+
+        y_label = det_labels[0]
+        y_index = labels.index(y_label)
+        if y_index >= data.shape[1]:
+            return False
+        y = data[:, y_index]
+
+        curve_name = f"scan{num}_{y_label}"
+        self.plot.addCurve(curve_name)
+        curve = self.plot.curves[curve_name]
+
+        curve._x = x
+        curve._y = y
+        curve.attach()
+        curve.setColor(self.plot.colorTable.getColor(curve_name))
+        curve.mne = f"Scan {num}: {cmd}"
+
+        return True
 
     def getAllItems(self):
         root = self.scantree.invisibleRootItem()
@@ -509,14 +749,82 @@ class SpecFileSource(DataSource1D):
             retlist.extend(self.getItems(child))
         return retlist
 
+    def _cacheKey(self, scanno):
+        # the last scan may still grow. it is not cached
+        entry = self.scanindex.getEntry(scanno)
+        if entry is None or scanno >= len(self.scanindex) - 1:
+            return None, entry
+        return (entry['offset'], entry['npts']), entry
+
+    def _readScan(self, scanno, entry, mcas=False):
+        """ 
+        Returns data, labels, meta (and mcas) for the scan with index entry, 
+        from the cache when possible. Headers are read from the indexed
+        byte range. FileSpec is only used for mca spectra
+        """
+        key, _entry = self._cacheKey(scanno)
+
+        record = self.scancache.get(key) if key is not None else None
+        if record is None:
+            record = {}
+
+        fields = {}
+
+        if record.get('data') is None:
+            fields['data'] = self._readScanData(scanno, entry)
+        if record.get('labels') is None:
+            fields['labels'] = entry['labels']
+        if record.get('meta') is None:
+            fields['meta'] = read_scan_header(self.scanindex.filename, entry)
+        if mcas and record.get('mcas') is None:
+            if entry.get('mcas'):
+                scan = self._fileSpec()[scanno]
+                fields['mcas'] = [mca.data for mca in scan.getMcas()]
+            else:
+                fields['mcas'] = []
+
+        if fields:
+            if key is not None:
+                record = self.scancache.put(key, **fields)
+            else:
+                record.update(fields)
+
+        return record
+
+    def _prefetchNeighbours(self, scanno):
+        items = []
+        for neighbour in (scanno + 1, scanno - 1):
+            if neighbour < 0:
+                continue
+            key, entry = self._cacheKey(neighbour)
+            if key is not None:
+                items.append((key, entry))
+
+        self.prefetcher.request(items)
+
+    def _readScanData(self, scanno, entry):
+        # parse data directly from the file. FileSpec if it cannot be done this way
+        try:
+            data = read_scan_data(self.scanindex.filename, entry)
+        except:
+            import traceback
+            log.log(2, "cannot read data for scan %s" % entry['number'])
+            log.log(3, traceback.format_exc())
+            data = None
+
+        if data is not None:
+            return data
+
+        return self._fileSpec()[scanno].getData()
+
     def getMcaData(self, index):
         if self.currentScan is not None:
-            return self.currentScan.getMcaData(index)
+            return self._fileSpec()[self.scanselected].getMcaData(index)
 
     def next(self):
         scanno = self.scanselected
         scanno += 1
-        if scanno < len(self.sf):
+        if scanno < len(self.scanindex):
             self.selectScan(scanno)
 
     def prev(self):
@@ -528,28 +836,27 @@ class SpecFileSource(DataSource1D):
     def selectScan(self, scanno, force=False):
 
         try:
-            scan = self.sf[scanno]
-    
             if scanno < 0:
-                scanno = len(self.sf) + scanno
+                scanno = len(self.scanindex) + scanno
+
+            entry = self.scanindex.getEntry(scanno)
+            if entry is None:
+                return
     
             if scanno == self.scanselected and force is False:
                 return
     
             self.scanselected = scanno
-            self.currentScan = scan
+            self.currentScan = entry
     
-            data = scan.getData()
+            record = self._readScan(scanno, entry, mcas=True)
+            data = record['data']
     
             self.datastatus = DATA_FILE
     
-            labels = scan.getLabels()
+            labels = record['labels']
     
-            scanmeta = {
-                'title':          "Scan %d - %s" % (scan.getNumber(), scan.getCommand()),
-                'command':        scan.getCommand(),
-                'scanno':         scan.getNumber(),
-            }
+            scanmeta = self._scanMeta(scanno, entry, record)
     
             scanobj = Scan(scanmeta['command'])
             self.setScanObject(scanobj)
@@ -564,21 +871,23 @@ class SpecFileSource(DataSource1D):
                 if not ycols:
                     ycols = [labels[-1]]
 
+ 
                 scanmeta['yColumns'] = ycols
-
-    
-            scanmeta.update(scan.getMeta())
     
             self.metadata = {}
             self.metadata.update(scanmeta)
     
-            self.scantree.setCurrentItem(self.treeItems[scanno])
+            if scanno < len(self.treeItems):
+                self.scantree.setCurrentItem(self.treeItems[scanno])
     
             self.setData(data, labels, scanmeta)
+            self._followTail(scanno, data)
 
-            mcas = [mca.data for mca in scan.getMcas()]
+            mcas = record['mcas']
             if len( mcas ) > 0:
                 self.app.show_mcas( mcas, parent=self )
+
+            self._prefetchNeighbours(scanno)
         except:
             import traceback
             log.log(2, "error selecting scan")
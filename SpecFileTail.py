@@ -0,0 +1,198 @@
+#******************************************************************************
+#
+#  @(#)SpecFileTail.py  	1.1  10/18/26 CSS
+#
+#  "splot" Release 3
+#
+#  Copyright (c) 2026
+#  by Certified Scientific Software.
+#  All rights reserved.
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a
+#  copy of this software ("splot") and associated documentation files (the
+#  "Software"), to deal in the Software without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so, subject to
+#  the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included
+#  in all copies or substantial portions of the Software.
+#
+#  Neither the name of the copyright holder nor the names of its contributors
+#  may be used to endorse or promote products derived from this software
+#  without specific prior written permission.
+#
+#     * The software is provided "as is", without warranty of any   *
+#     * kind, express or implied, including but not limited to the  *
+#     * warranties of merchantability, fitness for a particular     *
+#     * purpose and noninfringement.  In no event shall the authors *
+#     * or copyright holders be liable for any claim, damages or    *
+#     * other liability, whether in an action of contract, tort     *
+#     * or otherwise, arising from, out of or in connection with    *
+#     * the software or the use of other dealings in the software.  *
+#
+#******************************************************************************
+
+
+"""
+This module follows the last scan of a SPEC data file while it is being
+written.
+
+The tail reader remembers the byte offset just after the last complete
+line already consumed. Every read only parses the bytes appended since
+then, so a growing scan is never parsed again from the beginning.  
+A line is only consumed once its newline has been written, and groups of
+continued lines (mca data) only once the whole group is there.
+"""
+
+import os
+
+import numpy as np
+
+from pyspec.css_logger import log
+
+from SpecFileIndex import data_line_mask, parse_data_block
+
+
+class SpecFileTail(object):
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.stop()
+
+    def stop(self):
+        self.number = None
+        self.offset = None
+        self.ncols = 0
+
+    def isFollowing(self, number=None):
+        if self.offset is None:
+            return False
+        return number is None or number == self.number
+
+    def follow(self, entry, nbrows, ncols):
+        """
+        Starts following the scan described by index entry, of which nbrows 
+        data points with ncols columns were already read.
+        Returns False if the scan cannot be followed.
+        """
+        self.stop()
+
+        data_offset = entry.get('data_offset')
+        if data_offset is None:
+            return False
+
+        try:
+            block = self._readFrom(data_offset)
+        except (IOError, OSError):
+            return False
+
+        offset = self._skipRows(block, nbrows)
+        if offset is None:
+            return False
+
+        self.number = entry['number']
+        self.offset = data_offset + offset
+        self.ncols = ncols
+        return True
+
+    def read(self):
+        """
+        Reads the data points appended to the followed scan since last read.
+        Returns a tuple (rows, newscan). rows is None if the file cannot be
+        followed anymore (it was truncated or the columns changed) and the
+        scan must be read again. newscan is True if another scan was started
+        after the followed one. Following stops in both cases.
+        """
+        if self.offset is None:
+            return None, False
+
+        try:
+            size = os.stat(self.filename).st_size
+            if size < self.offset:
+                log.log(2, "file %s was truncated" % self.filename)
+                self.stop()
+                return None, False
+
+            block = self._readFrom(self.offset, size)
+        except (IOError, OSError):
+            self.stop()
+            return None, False
+
+        newscan = False
+
+        if block.startswith(b"#S "):
+            end = 0
+            newscan = True
+        else:
+            end = block.find(b"\n#S ")
+            if end != -1:
+                end += 1
+                newscan = True
+            else:
+                end = self._lastCompleteLine(block)
+
+        block = block[:end]
+        rows = parse_data_block(block, self.ncols)
+
+        if rows.shape[1] != self.ncols:
+            log.log(2, "columns changed in scan %s" % self.number)
+            self.stop()
+            return None, newscan
+
+        if newscan:
+            self.stop()
+        else:
+            self.offset += end
+
+        return rows, newscan
+
+    def _readFrom(self, offset, size=None):
+        with open(self.filename, "rb") as fd:
+            if size is None:
+                size = os.fstat(fd.fileno()).st_size
+            fd.seek(offset)
+            return fd.read(size - offset)
+
+    def _lastCompleteLine(self, block):
+        """ Returns the length of block up to its last complete line that is not continued """
+        end = block.rfind(b"\n") + 1
+
+        while end > 0:
+            line = block[:end - 1].rstrip(b"\r")
+            if not line.endswith(b"\\"):
+                break
+            end = block.rfind(b"\n", 0, end - 1) + 1
+
+        return end
+
+    def _skipRows(self, block, nbrows):
+        """ Returns the offset in block just after its data line number nbrows """
+
+        if nbrows == 0:
+            return 0
+
+        end = block.find(b"\n#S ")
+        if end != -1:
+            block = block[:end + 1]
+
+        block = block[:self._lastCompleteLine(block)]
+
+        buf = np.frombuffer(block, dtype=np.uint8)
+        newlines = np.flatnonzero(buf == ord("\n"))
+        if not len(newlines):
+            return None
+
+        starts = np.concatenate(([0], newlines[:-1] + 1))
+
+        ends = newlines.copy()
+        crlf = ends > starts
+        crlf[crlf] = buf[ends[crlf] - 1] == ord("\r")
+        ends -= crlf
+
+        lines = np.flatnonzero(data_line_mask(buf, starts, ends))
+        if len(lines) < nbrows:
+            return None
+
+        return int(newlines[lines[nbrows - 1]]) + 1
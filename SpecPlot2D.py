@@ -43,6 +43,7 @@ from pyspec.graphics import qt_variant, mpl_version_no
 from Constants import *
 import numpy as np
 import math
+import time
 
 from Features import features, setFeature
 from Preferences import Preferences
@@ -106,6 +107,56 @@ if grid_interp_method is None:
 
 log.log(3,"INTERPOLATION method for irregular data:  %s" % grid_interp_method)
 
+def position_jitter(values, resolution=MESH_RESOLUTION):
+    """
+    Estimates how far positions of a same grid column/row spread. Steps
+    cancel out in second differences (in acquisition order) so what is left
+    is the jitter. Never more than `resolution`
+    """
+    if len(values) < 3:
+        return resolution
+    noise = np.median(np.abs(np.diff(np.asarray(values, dtype=float), 2)))
+    return min(3 * noise, resolution)
+
+def bin_positions(values, tolerance=MESH_TOLERANCE, resolution=MESH_RESOLUTION):
+    """
+    Groups motor positions into grid bins. Positions closer than the motor
+    jitter (see position_jitter), or than `tolerance` times the median mesh
+    step, are merged into the same bin.
+
+    Returns the bin centers, the bin index for each value and the merging
+    distance used.
+    """
+    uvals, inverse = np.unique(values, return_inverse=True)
+
+    if len(uvals) > 1:
+        gaps = np.diff(uvals)
+        jitter = position_jitter(values, resolution)
+        steps = gaps[gaps > jitter]
+        maxdist = jitter
+        if len(steps):
+            maxdist = max(jitter, np.median(steps) * tolerance)
+        binno = np.concatenate(([0], np.cumsum(gaps > maxdist)))
+    else:
+        maxdist = 0.0
+        binno = np.zeros(len(uvals), dtype=int)
+
+    centers = np.bincount(binno, weights=uvals) / np.bincount(binno)
+    return centers, binno[inverse.ravel()], maxdist
+
+def same_values(first, second):
+    """ True if both sequences of values are equal. nan is equal to nan """
+    return np.array_equal(np.asarray(first, dtype=float),
+                          np.asarray(second, dtype=float), equal_nan=True)
+
+def nearest_bin(centers, values):
+    """ index of the bin center closest to each value """
+    if len(centers) == 1:
+        return np.zeros(len(values), dtype=int)
+    idx = np.clip(np.searchsorted(centers, values), 1, len(centers)-1)
+    left = values - centers[idx-1] < centers[idx] - values
+    return idx - left
+
 class SpecPlot2D(QWidget):
 
     def __init__(self,parent,*args):
@@ -133,6 +184,15 @@ class SpecPlot2D(QWidget):
 
         self.double_clicked = False
 
+        # artists kept between updates
+        self.plot_2d = None      # mappable for the current style
+        self.plot_style = None
+        self.plot_artists = []   # everything to remove when the style changes
+        self.cb_axes = None
+        self.colorbar = None
+
+        self.mesh_grid = None    # last regular grid. extended as points arrive
+
         self._layout = QVBoxLayout()
         self.fig = Figure()
 
@@ -294,6 +354,8 @@ class SpecPlot2D(QWidget):
 
         if columnnames:
              zlab, xlab, ylab = columnnames
+             if [zlab, xlab, ylab] != [self.zlabel, self.xlabel, self.ylabel]:
+                 self.mesh_grid = None
              self._setColumnNames(zlab, xlab, ylab)
 
         self.zdata = zdat
@@ -325,10 +387,11 @@ class SpecPlot2D(QWidget):
 
     def _update(self):
 
+        t0 = time.time()
         plt = None
-        self.axes_2d.clear()
 
         if self.zdata is None or not self.zdata.any():
+            self._remove_2d()
             return
 
         # 
@@ -339,16 +402,12 @@ class SpecPlot2D(QWidget):
             # tolerance
         if self.xdata is not None:
             xvalues = np.unique(self.xdata)
-            xvalues.sort()
-            dist = [xvalues[i+1] - xvalues[i] for i in range(len(xvalues) - 1) ]
-            x_ave_dist = np.mean(dist)
+            x_ave_dist = np.diff(xvalues).mean() if len(xvalues) > 1 else 0.0
             self.x_sel_tol = x_ave_dist * self.tolerance_factor # is the discrimination value to select values in list
 
         if self.ydata is not None:
             yvalues = np.unique(self.ydata)
-            yvalues.sort()
-            dist = [yvalues[i+1] - yvalues[i] for i in range(len(yvalues) - 1) ]
-            y_ave_dist = np.mean(dist)
+            y_ave_dist = np.diff(yvalues).mean() if len(yvalues) > 1 else 0.0
             self.y_sel_tol = y_ave_dist * self.tolerance_factor
 
             # prepare data in a grid if needed (x,y,z) 
@@ -392,11 +451,15 @@ class SpecPlot2D(QWidget):
              self.axes_2d.set_ylim([ybeg,yend])
 
              if style_2d == "contour":
+                 # contour sets cannot be updated in place. they are rebuilt
+                 self._remove_2d()
                  if grid_ok:
                      plt = self.axes_2d.contour(xi, yi, zi, 6, colors='k')
                      self.axes_2d.clabel(plt, fmt="%.3g", fontsize=9, inline=1)
+                     self.plot_artists.append(plt)
                      plt = self.axes_2d.contourf(xi, yi, zi, cmap=pyplot.cm.jet)
              elif style_2d == "triangles":
+                 self._remove_2d()
                  min_radius = 0.25
                  triang = tri.Triangulation(self.xdata,self.ydata)
                  xmid = self.xdata[triang.triangles].mean(axis=1)
@@ -405,48 +468,104 @@ class SpecPlot2D(QWidget):
                  triang.set_mask(mask)
                  plt = self.axes_2d.tripcolor(triang, self.zdata, shading='flat')
              elif style_2d == "wireframe":
+                 self._remove_2d()
                  if grid_ok:
                      plt = self.axes_2d.plot_wireframe(xi, yi, zi)
                      #self.axes_2d.clabel(plt, fontsize=9, inline=1)
              elif style_2d == "3dsurface":
+                 self._remove_2d()
                  if grid_ok:
                      plt = self.axes_2d.plot_surface(xi, yi, zi)
                      #self.axes_2d.clabel(plt, fontsize=9, inline=1)
              elif style_2d == "image":
-                 zdat = np.flipud(zi)
                  if grid_ok:
-                     plt = self.axes_2d.imshow(zdat, extent=(xi.min(), xi.max(), \
-                        yi.min(), yi.max()), aspect="auto", interpolation='nearest')
+                     zdat = np.flipud(zi)
+                     extent = (xi.min(), xi.max(), yi.min(), yi.max())
+                     if self.plot_style == "image":
+                         plt = self.plot_2d
+                         plt.set_data(zdat)
+                         plt.set_extent(extent)
+                         plt.autoscale()
+                     else:
+                         self._remove_2d()
+                         plt = self.axes_2d.imshow(zdat, extent=extent, \
+                            aspect="auto", interpolation='nearest')
+                 else:
+                     self._remove_2d()
              else:  # only scattered. point size correspond to value
                  area = np.pi * (10 * self.zdata/zmax)**2  
-                 plt = self.axes_2d.scatter(self.xdata, self.ydata , c=zdat, s=area, alpha=0.5)
+                 if self.plot_style == "scatter":
+                     plt = self.plot_2d
+                     plt.set_offsets(np.column_stack([self.xdata, self.ydata]))
+                     plt.set_array(np.asarray(zdat))
+                     plt.set_sizes(area)
+                     plt.autoscale()
+                 else:
+                     self._remove_2d()
+                     plt = self.axes_2d.scatter(self.xdata, self.ydata , c=zdat, s=area, alpha=0.5)
                  show_points = False
 
         elif self.data_type == "image":
+             self._remove_2d()
              zdat = self.zdata
              im = self.axes_2d.imshow(zdat, extent=(xdat.min()-0.5, xdat.max()+0.5, \
                         ydat.min()-1, ydat.max()+1), aspect="auto", interpolation='nearest')
+             self.plot_artists.append(im)
 
         if show_points:
             self.axes_2d.scatter(self.xdata, self.ydata, c='b', marker='o', s=5)
 
         if plt:
-            self._format_axes()
-            self.fig.subplots_adjust(wspace=0.3,bottom=0.1, right=0.85, left=0.1, top=0.9, hspace=0.6)
+            newplot = plt is not self.plot_2d
+
+            if newplot:
+                self.plot_2d = plt
+                self.plot_style = style_2d
+                self.plot_artists.append(plt)
+                self._format_axes()
+                self.fig.subplots_adjust(wspace=0.3,bottom=0.1, right=0.85, left=0.1, top=0.9, hspace=0.6)
 
             # add colorbar
-            cax = self.fig.add_axes([0.9, 0.1, 0.01, 0.8])
-            try:
-                cax.tick_params(labelsize=10)
-            except:
-                pass
-            self.fig.colorbar(plt, cax=cax)
+            if self.cb_axes is None:
+                self.cb_axes = self.fig.add_axes([0.9, 0.1, 0.01, 0.8])
+
+            if newplot or self.colorbar is None:
+                # contour levels are fixed when the colorbar is created
+                self.cb_axes.clear()
+                try:
+                    self.cb_axes.tick_params(labelsize=10)
+                except:
+                    pass
+                self.colorbar = self.fig.colorbar(plt, cax=self.cb_axes)
+            else:
+                self.colorbar.update_normal(plt)
 
             self.figcanvas.draw()
 
+        log.log(3, "2D plot (%s) updated in %.4f secs" % (self.style_2d, time.time()-t0))
+
         # This line is meant to update the x_plot while data is arriving. Do not use it yet
         #self.set_x_plot(self.ydata[-1])
 
+    def _remove_2d(self):
+        """ remove the artists of the last 2D plot, keeping axes and colorbar """
+        for art in self.plot_artists:
+            try:
+                if mpl_version_no() < [3,8,0] and hasattr(art, 'collections'):
+                    # contour sets were not artists before matplotlib 3.8
+                    for coll in art.collections:
+                        coll.remove()
+                    for txt in getattr(art, 'labelTexts', []):
+                        txt.remove()
+                else:
+                    art.remove()
+            except (ValueError, NotImplementedError):
+                pass
+
+        self.plot_artists = []
+        self.plot_2d = None
+        self.plot_style = None
+
     def mouse_clicked(self,ev):
         self.last_rect = None
         if not ev.inaxes:
@@ -614,27 +733,26 @@ class SpecPlot2D(QWidget):
 
     def gridify(self, xdat, ydat, zdat):
 
+        xdat = np.asarray(xdat)
+        ydat = np.asarray(ydat)
+        zdat = np.asarray(zdat)
+
+        grid = None
+        if len(xdat) == len(ydat) == len(zdat):
+            grid = self._extend_mesh_grid(xdat, ydat, zdat)
+            if grid is None:
+                grid = self._make_mesh_grid(xdat, ydat, zdat)
+
+        self.mesh_grid = grid
+
+        if grid is not None:
+            # regular mesh (possibly still in progress). missing cells are nan
+            return 1, grid['xi'], grid['yi'], grid['zi']
+
         xvals = np.unique(xdat)
         yvals = np.unique(ydat)
     
-        if len(xvals) * len(yvals) == len(zdat):
-            # perfect square of data
-            xvals.sort()
-            yvals.sort()
-            xi = xvals; yi = yvals
-    
-            xl = list(xi)
-            yl = list(yi)
-    
-            zi = np.empty((len(yvals),len(xvals)))
-    
-            for ptno in range(len(zdat)):
-                xidx =  xl.index( xdat[ptno] )
-                yidx =  yl.index( ydat[ptno] )
-                zi[yidx,xidx] = zdat[ptno]
-            code = 1
-    
-        elif len(xdat) == len(ydat) and len(xdat) == len(zdat):
+        if len(xdat) == len(ydat) and len(xdat) == len(zdat):
             log.log(3,"irregular linear data %s / %s" % (len(xdat), len(ydat)) )
             npoints = len(xvals)
             xi = np.linspace(xdat.min(), xdat.max(), npoints)
@@ -651,11 +769,81 @@ class SpecPlot2D(QWidget):
         else:
             code = -1
     
-        if code == 0:
+        if code <= 0:
             xi = yi = zi = None
     
         return code, xi, yi, zi
 
+    def _make_mesh_grid(self, xdat, ydat, zdat):
+        """ 
+        Bins the points in a regular grid. Returns None if the points do
+        not fill a grid (except for the last row/column being measured)
+        """
+        xi, xidx, xdist = bin_positions(xdat)
+        yi, yidx, ydist = bin_positions(ydat)
+
+        nbx, nby = len(xi), len(yi)
+        npts = len(zdat)
+
+        if npts <= nbx * nby - max(nbx, nby):
+            return None
+
+        cells = yidx * nbx + xidx
+        if len(np.unique(cells)) != npts:  # two points in the same cell
+            return None
+
+        zi = np.full((nby, nbx), np.nan)
+        zi[yidx, xidx] = zdat
+
+        return {'xi': xi, 'yi': yi, 'zi': zi, 'xdist': xdist, 'ydist': ydist,
+                'npts': npts, 'first': (xdat[0], ydat[0], zdat[0]), 
+                'last': (xdat[-1], ydat[-1], zdat[-1])}
+
+    def _extend_mesh_grid(self, xdat, ydat, zdat):
+        """
+        Adds the points arrived since the last call to the current grid.
+        Returns None if the grid has to be recalculated
+        """
+        grid = self.mesh_grid
+
+        if grid is None:
+            return None
+
+        prev = grid['npts']
+        npts = len(zdat)
+
+        if npts < prev:
+            return None
+
+        if not same_values((xdat[0], ydat[0], zdat[0]), grid['first']) or \
+                not same_values((xdat[prev-1], ydat[prev-1], zdat[prev-1]), grid['last']):
+            return None  # not the same data
+
+        if npts == prev:
+            return grid
+
+        xnew, ynew, znew = xdat[prev:], ydat[prev:], zdat[prev:]
+
+        xidx = nearest_bin(grid['xi'], xnew)
+        yidx = nearest_bin(grid['yi'], ynew)
+
+        # a new row or column is started. recalculate the grid
+        if (np.abs(grid['xi'][xidx] - xnew) > grid['xdist']).any() or \
+                (np.abs(grid['yi'][yidx] - ynew) > grid['ydist']).any():
+            return None
+
+        zi = grid['zi']
+        nbx = len(grid['xi'])
+        if len(np.unique(yidx * nbx + xidx)) != len(znew) or \
+                not np.isnan(zi[yidx, xidx]).all():
+            return None
+
+        zi[yidx, xidx] = znew
+
+        grid['npts'] = npts
+        grid['last'] = (xdat[-1], ydat[-1], zdat[-1])
+        return grid
+
     def saveAsImage(self, filename,title):
         self.savefig(title, filename)
 
@@ -691,6 +879,8 @@ def main():
 
     if "file" in sys.argv:
         testfile(dis)
+    elif "checkmesh" in sys.argv:
+        sys.exit(check_mesh_grid(dis))
     else:
          # scatter
          xdat = np.array([1,2,3,4]*4)
@@ -715,6 +905,42 @@ def main():
 
     sys.exit(exec_())
 
+def check_mesh_grid(dis):
+    """
+    Feeds meshes point by point to gridify. Each must come out as the exact
+    regular grid, whatever the motor step and with some position jitter
+    """
+    rand = np.random.RandomState(0)
+
+    meshes = [
+        # name, x positions, y positions, jitter
+        ("fine step (0.001)", np.arange(10) * 0.001, np.arange(5) * 0.001, 0),
+        ("coarse step (0.5)", np.arange(20) * 0.5, np.arange(15) * 0.5, 0),
+        ("jittered (0.002)", np.arange(20) * 0.1, np.arange(15) * 0.1, 0.002),
+    ]
+
+    failed = 0
+    for name, xpos, ypos, jitter in meshes:
+        xmesh, ymesh = np.meshgrid(xpos, ypos)
+        xdat = xmesh.ravel() + rand.uniform(-jitter, jitter, xmesh.size)
+        ydat = ymesh.ravel() + rand.uniform(-jitter, jitter, xmesh.size)
+        zdat = np.arange(xmesh.size, dtype=float)
+
+        dis.mesh_grid = None
+        bad = []
+        for npts in range(3, len(zdat) + 1):
+            code, xi, yi, zi = dis.gridify(xdat[:npts], ydat[:npts], zdat[:npts])
+            if code != 1:
+                bad.append(npts)
+
+        if bad or zi.shape != xmesh.shape or not (zi.ravel() == zdat).all():
+            failed += 1
+            print("%s: not gridded at points %s" % (name, bad))
+        else:
+            print("%s: ok" % name)
+
+    return failed
+
 def testfile(dis):
     from pyspec.file.spec import FileSpec
     from DataBlock import DataBlock
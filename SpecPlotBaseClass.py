@@ -50,6 +50,7 @@ from pyspec.css_logger import log
 from Preferences import Preferences
 from PlotOptions import PlotOptionsDialog, PlotDefaults, LegendPositions
 import Colors
+from PlotDecimation import minmax_decimate
 
 class SpecPlotCurve(object):
 
@@ -61,6 +62,11 @@ class SpecPlotCurve(object):
         self._y = np.asarray([])
         self._dy = np.asarray([])   # for errorbars
 
+        # decimated data for display (see SpecPlotBaseClass.decimateCurve)
+        self._lod_data = None
+        self._lod_index = None
+        self._lod_key = None
+
         self.uselines = PlotDefaults['uselines']
         self.linethick = PlotDefaults['linethick']
         self.usedots = PlotDefaults['usedots']
@@ -87,6 +93,31 @@ class SpecPlotCurve(object):
     def getXData(self):
         return self._x
 
+    def setPlotIndex(self, index, key):
+        """ Sets the indexes of the points to be drawn (all of them if index is None) """
+        self._lod_data = (self._x, self._y)
+        self._lod_index = index
+        self._lod_key = key
+
+    def getPlotIndex(self):
+        # only valid while data is the one decimated
+        if self._lod_data is None or self._lod_index is None:
+            return None
+        if self._lod_data[0] is not self._x or self._lod_data[1] is not self._y:
+            return None
+        return self._lod_index
+
+    def getPlotData(self):
+        """ Returns the x and y values to be drawn. Decimated data if the curve has too many points """
+        index = self.getPlotIndex()
+        if index is None:
+            return self._x, self._y
+        return self._x[index], self._y[index]
+
+    def needsDecimation(self, key):
+        return self._lod_data is None or self._lod_key != key or \
+            self._lod_data[0] is not self._x or self._lod_data[1] is not self._y
+
     def getXMin(self):
         return self._x.min()
     def getXMax(self):
@@ -294,6 +325,9 @@ class SpecPlotBaseClass(object):
 
         self.pending_actions = set()
 
+        # view (x range, width) for which curves were decimated
+        self.lod_key = None
+
         self.actiontimer = QTimer()
         self.actiontimer.timeout.connect(self._do_pending)
         self.initPendingActions()
@@ -315,6 +349,7 @@ class SpecPlotBaseClass(object):
         self.legend_position = self.prefs.getValue('legendpos')
 
         self.showpts = self.prefs.getValue('showpts')
+        self.webglpoints = self.prefs.getValue('webglpoints')
 
         if self.showbars is None:
             self.showbars = PlotDefaults['showbars']
@@ -359,6 +394,11 @@ class SpecPlotBaseClass(object):
         else:
             self.showpts = int(self.showpts)
 
+        if self.webglpoints is None:
+            self.webglpoints = PlotDefaults['webglpoints']
+        else:
+            self.webglpoints = int(self.webglpoints)
+
 
         if gridmode == "On":
             self.showing_grid = True
@@ -385,6 +425,8 @@ class SpecPlotBaseClass(object):
 
         do_replot = False
 
+        self._checkViewport()
+
         while len(self.pending_actions):
             reason, action = self.pending_actions.pop()
             if reason == "replot":
@@ -609,6 +651,11 @@ class SpecPlotBaseClass(object):
         self.prefs['showpts'] = nbpts
         self.showpts = nbpts
 
+    def setWebGLPoints(self, nbpts):
+        """ Curves drawn with more points use WebGL, for toolkits that support it """
+        self.webglpoints = int(nbpts)
+        self.prefs.setValue('webglpoints', self.webglpoints)
+
     def queue_replot(self):
         self.queue_action("replot", self.replot)
 
@@ -742,6 +789,65 @@ class SpecPlotBaseClass(object):
             ydata = self.filterLog(colname, ydata, curve)
             self.fillCurveData(curve,xdata,ydata)
 
+    def getXViewRange(self):
+        """ 
+        Returns the x range shown in the plot or None if it shows all data.
+        To be implemented by each toolkit plot implementation that can zoom
+        """
+        return None
+
+    def getViewWidth(self):
+        """ Returns the number of pixel columns used to draw curves """
+        return self.width()
+
+    def getViewKey(self):
+        xrange = self.getXViewRange()
+        if xrange is not None:
+            xrange = tuple(xrange)
+        return (xrange, self.getViewWidth())
+
+    def _checkViewport(self):
+        # decimated curves depend on zoom and widget width
+        key = self.getViewKey()
+        if key == self.lod_key:
+            return
+
+        self.lod_key = key
+
+        redraw = False
+        for curve in self.curves.values():
+            redraw = self.decimateCurve(curve) or redraw
+
+        if redraw:
+            self.queue_replot()
+
+    def decimateCurve(self, curve):
+        """ 
+        Selects the points of curve to be drawn for the current view.
+        Returns True if they changed
+        """
+        key = self.lod_key
+        if key is None:
+            key = self.lod_key = self.getViewKey()
+
+        if not curve.needsDecimation(key):
+            return False
+
+        xrange, width = key
+
+        was_decimated = curve.getPlotIndex() is not None
+
+        index = None
+        if self.plotMode is not PlotMeshMode:
+            try:
+                index = minmax_decimate(curve._x, curve._y, width, xrange)
+            except:
+                import traceback
+                log.log(2, traceback.format_exc())
+
+        curve.setPlotIndex(index, key)
+        return index is not None or was_decimated
+
     def fillCurveData(self, curve, xdata, ydata):
         if self.plotMode is PlotTimeMode:
             nbpts = len(xdata)
@@ -756,6 +862,7 @@ class SpecPlotBaseClass(object):
             #ydata = ydata[fidx:]
 
         curve.setData(xdata,ydata)
+        self.decimateCurve(curve)
 
     def fillData0(self):
         # fill data for curves for every y
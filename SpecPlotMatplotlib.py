@@ -1474,7 +1474,9 @@ class SpecPlotCanvas(FigureCanvas):
         else:
             self.fig = Figure()
 
+        # figure saved without curves, markers and crosshairs, for blitting
         self.bkg = None
+        self.bkg_state = None
 
         super(SpecPlotCanvas, self).__init__(self.fig)
         self.y1axes = self.fig.add_subplot(111)
@@ -1626,6 +1628,10 @@ class SpecPlotCanvas(FigureCanvas):
             fontP = FontProperties()
             fontP.set_size('small') 
             legend = self.y1axes.legend(hs,ls, loc=locvalue, prop=fontP)
+            # legend handles copy the animated flag of the curves. the legend
+            # is part of the background
+            for artist in legend.get_lines() + legend.get_patches():
+                artist.set_animated(False)
             #legend.draggable()
         else:
             self.hide_legend()
@@ -1639,6 +1645,78 @@ class SpecPlotCanvas(FigureCanvas):
         except:
             pass
 
+    # blitting. Curves, markers, crosshairs and rubberbands (all artists
+    # added to the axes) are animated: the figure is drawn without them and
+    # saved as background. While axes, ticks, labels and legend do not change
+    # only the animated artists are drawn on top of the saved background
+    def dynamic_artists(self):
+        artists = []
+        for axes in (self.y1axes, self.y2axes):
+            artists.extend(axes.lines)
+            artists.extend(axes.patches)
+            artists.extend(axes.texts)
+        return artists
+
+    def background_state(self):
+        """ Everything drawn in the background. Background must be redrawn if it changes """
+        state = [tuple(self.fig.get_size_inches()), self.fig.dpi,
+                 self.y1_isflat, self.y2_isflat, self.use_y1, self.use_y2, self.showing_grid]
+
+        for axes in (self.y1axes, self.y2axes):
+            state.extend([axes.get_xlim(), axes.get_ylim(), 
+                          tuple(axes.get_xticks()), tuple(axes.get_yticks()),
+                          axes.get_xscale(), axes.get_yscale(),
+                          axes.get_xlabel(), axes.get_ylabel(), axes.get_title(loc="left"),
+                          tuple(axes.patch.get_facecolor())])
+
+        legend = self.y1axes.get_legend()
+        if legend is not None and legend.get_visible():
+            state.append(tuple(text.get_text() for text in legend.get_texts()))
+        else:
+            state.append(None)
+
+        return state
+
+    def draw(self):
+        for artist in self.dynamic_artists():
+            artist.set_animated(True)
+
+        super(SpecPlotCanvas, self).draw()
+
+        self.bkg = self.copy_from_bbox(self.fig.bbox)
+        self.bkg_state = self.background_state()
+
+        self.draw_animated()
+
+    def draw_animated(self):
+        """ Draws the animated artists on the saved background. Returns False if there is none """
+        if self.bkg is None:
+            return False
+
+        self.restore_region(self.bkg)
+
+        artists = [artist for artist in self.dynamic_artists() if artist.get_visible()]
+        for artist in sorted(artists, key=lambda artist: artist.get_zorder()):
+            artist.axes.draw_artist(artist)
+
+        self.blit(self.fig.bbox)
+        return True
+
+    def redraw(self):
+        """ Draws the whole figure only if the background changed """
+        if self.bkg is not None and self.background_state() == self.bkg_state:
+            self.draw_animated()
+            return
+
+        try:
+            if mpl_version_no() > [1,2,0] and not is_windows():
+                self.fig.tight_layout()
+        except BaseException as e:
+            import traceback
+            log.log(2, traceback.format_exc())
+
+        self.draw()
+
     def emptyStr(self,x,pos):
         # percentage example
         # log.log(3,"Formatting x=%s, pos=%s" % (x,pos))
@@ -2065,12 +2143,14 @@ class SpecPlotCurveMatplotlib(SpecPlotCurve):
         if not self.isAttached():
             return
 
+        xdata, ydata = self.getPlotData()
+
         if self.plot_pending:
-            self.line = self.canvas().plot(self._x, self._y, self.mne, self.yaxis)[0]
+            self.line = self.canvas().plot(xdata, ydata, self.mne, self.yaxis)[0]
             self.plot_pending = False
         else:
-            self.line.set_xdata(self._x)
-            self.line.set_ydata(self._y)
+            self.line.set_xdata(xdata)
+            self.line.set_ydata(ydata)
 
         self.configure()
 
@@ -2330,6 +2410,13 @@ class SpecPlotMatplotlib(QWidget, SpecPlotBaseClass):
     # update plot
     def getY1ViewRange(self):
         return  self.canvas.y1axes.get_ylim()
+
+    def getXViewRange(self):
+        if self.zoomer is not None and self.zoomer.isZoomed():
+            return self.canvas.y1axes.get_xlim()
+        if not self.axes_auto.get(X_AXIS, True) and X_AXIS in self.axes_limits:
+            return self.axes_limits[X_AXIS]
+        return None
      
     def emit_configuration_changed(self):
         self.configurationChanged.emit()
@@ -2514,17 +2601,25 @@ class SpecPlotMatplotlib(QWidget, SpecPlotBaseClass):
             self.queue_replot()
 
     def mouse_move(self, event):
+        # only crosshairs or rubberbands move. no need for a full replot
         if self.zoommode == CROSSHAIRS_MODE:
             self.crosshairs.mouse_move(event)
-            self.queue_replot()
+            self.queue_blit()
         elif self.zoommode == REGIONZOOM_MODE:
             if event.inaxes and self.regionzoom.isSelecting():
                 self.regionzoom.mouse_move(event)
-                self.queue_replot()
+                self.queue_blit()
         elif self.zoommode == ZOOM_MODE:
             if event.inaxes and self.zoomer.isSelecting():
                 self.zoomer.mouse_move(event)
-                self.queue_replot()
+                self.queue_blit()
+
+    def queue_blit(self):
+        self.queue_action("blit", self._blit)
+
+    def _blit(self):
+        if not self.canvas.draw_animated():
+            self.queue_replot()
 
     def key_pressed(self, ev):
         if ev.key == 'escape':
@@ -2574,14 +2669,8 @@ class SpecPlotMatplotlib(QWidget, SpecPlotBaseClass):
 
         self._replot_markers()
 
-        try:
-            if mpl_version_no() > [1,2,0] and not is_windows():
-                self.canvas.fig.tight_layout()
-        except BaseException as e:
-            import traceback
-            log.log(2, traceback.format_exc())
-
-        self.canvas.draw()
+        # full draw only if axes, ticks or legend changed
+        self.canvas.redraw()
 
         if self.zoommode == ZOOM_MODE and not self.zoomer.isZoomed():
             self.zoomer.setZoomBase()
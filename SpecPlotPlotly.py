@@ -5,7 +5,10 @@
 
 from __future__ import annotations
 import json
+import time
+import base64
 import weakref
+import zlib
 import numpy as np
 import os
 import tempfile, pathlib
@@ -18,10 +21,12 @@ from PySide6.QtWebEngineWidgets import QWebEngineView
 from PySide6.QtWebChannel import QWebChannel
 
 import plotly.graph_objects as go
+from plotly.utils import PlotlyJSONEncoder
 
 # Splot existing infrastructure:
 from SpecPlotBaseClass import SpecPlotBaseClass, SpecPlotCurve, SpecPlotMarker
 from Constants import *  # expects X_AXIS, Y1_AXIS, Y2_AXIS, etc.
+from Preferences import Preferences
 
 
 # ------------------------- Qt⇄JS Bridge -------------------------
@@ -30,6 +35,7 @@ class _PlotlyBridge(QObject):
     """Bridge that JS calls into; emits Qt signals compatible with SpecPlotBaseClass usage."""
     pointSelected = Signal(str, float)             # (xlabel, x)
     regionSelected = Signal(str, float, float)     # (xlabel, x0, x1)
+    xRangeChanged = Signal(object)                 # (x0, x1) or None when autoscaled
 
     @Slot(str, float)
     def emitPointSelected(self, xlabel: str, x: float):
@@ -41,6 +47,14 @@ class _PlotlyBridge(QObject):
         lo, hi = (x0, x1) if x0 <= x1 else (x1, x0)
         self.regionSelected.emit(xlabel, lo, hi)
 
+    @Slot(float, float)
+    def emitXRangeChanged(self, x0: float, x1: float):
+        self.xRangeChanged.emit((min(x0, x1), max(x0, x1)))
+
+    @Slot()
+    def emitXRangeReset(self):
+        self.xRangeChanged.emit(None)
+
 
 # ------------------------- Legend placement map -------------------------
 _PLOTLY_LEGEND_POS = {
@@ -58,6 +72,61 @@ def _legend_layout_from_key(key: str):
     return dict(x=x, y=y, xanchor=xanchor, yanchor=yanchor, bgcolor="rgba(255,255,255,0.6)", bordercolor="rgba(0,0,0,0.15)")
 
 
+# ------------------------- Incremental update helpers -------------------------
+
+_MISSING = object()
+
+def _flatten_layout(layout, prefix=""):
+    """Layout as {"xaxis.range": [..], ...} as accepted by Plotly.relayout"""
+    flat = {}
+    for key, value in layout.items():
+        if key == "template" and not prefix:   # never changes. large
+            continue
+        if isinstance(value, dict) and value:
+            flat.update(_flatten_layout(value, prefix + key + "."))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+# ------------------------- Curve data transport -------------------------
+#
+# Curve arrays are sent to the page as base64 encoded little endian typed
+# arrays {dtype: "f8", bdata: "..."} ("binary", default), as 32 bit floats
+# ("binary32", half the size, single precision) or as JSON lists ("json").
+# Chosen with the "plotly_transport" preference.
+
+_TRANSPORT_DTYPES = {"binary": "f8", "binary32": "f4"}
+
+def _encode_array(a, transport="binary"):
+    a = np.asarray(a)
+    dtype = _TRANSPORT_DTYPES.get(transport)
+
+    if dtype is None or a.dtype.kind not in "biuf":
+        return a.tolist()
+
+    a = np.ascontiguousarray(a, dtype="<" + dtype)
+    return {"dtype": dtype, "bdata": base64.b64encode(a.tobytes()).decode("ascii")}
+
+def _make_trace(style, **data):
+    # same markers, colors and hover for both. scattergl draws with WebGL
+    style = dict(style)
+    if style.pop("type", "scatter") == "scattergl":
+        return go.Scattergl(**style, **data)
+    return go.Scatter(**style, **data)
+
+def _crc(a, crc=0):
+    return zlib.crc32(np.ascontiguousarray(a), crc)
+
+def _sent_info(x, y):
+    # number and checksums of the points sent. recognizes them when new ones are appended
+    return (len(x), _crc(x), _crc(y))
+
+def _extended_info(info, x, y):
+    # info of the points sent with x, y appended to them
+    npts, xcrc, ycrc = info
+    return (npts + len(x), _crc(x, xcrc), _crc(y, ycrc))
+
+
 # ------------------------- Plotly “Canvas” -------------------------
 
 from PySide6.QtCore import QUrl
@@ -88,6 +157,9 @@ class _PlotlyCanvas:
         self._ready = False
         self._pending = None
 
+        # encoding of curve arrays (see _encode_array)
+        self.transport = "binary"
+
         # connect BEFORE setHtml so we don't miss the signal
         self.web.loadFinished.connect(self._on_load_finished)
         self._init_html()
@@ -180,11 +252,25 @@ class _PlotlyCanvas:
             <body>
             <div id="plot"></div>
             <script>
+            // Curve data may come as base64 encoded typed arrays
+            // {{dtype: 'f8' | 'f4', bdata: '...'}}. Plotly takes typed arrays as they are
+            window.decodeArray = function(a) {{
+            if (!a || typeof a !== 'object' || a.bdata === undefined) return a;
+            const bin = atob(a.bdata);
+            const bytes = new Uint8Array(bin.length);
+            for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+            return (a.dtype === 'f4') ? new Float32Array(bytes.buffer) : new Float64Array(bytes.buffer);
+            }};
+
             // Define renderFigure first so Python can call it at any time
             window.renderFigure = function(figJSON, cfgJSON) {{
             try {{
                 const fig = JSON.parse(figJSON);
                 const cfg = JSON.parse(cfgJSON);
+                (fig.data || []).forEach((tr) => {{
+                tr.x = decodeArray(tr.x);
+                tr.y = decodeArray(tr.y);
+                }});
                 const plot = document.getElementById('plot');
                 if (plot && plot.removeAllListeners) plot.removeAllListeners();
 
@@ -216,6 +302,19 @@ class _PlotlyCanvas:
                 if (!Number.isNaN(x)) window.qt_bridge.emitPointSelected(xLabel(fig), x);
                 }});
 
+                // zoom and pan. lets python decimate curves for the range shown
+                plot.on('plotly_relayout', (e) => {{
+                if (!window.qt_bridge || !e || window.py_relayout) return;
+                if (e['xaxis.autorange']) {{
+                    window.qt_bridge.emitXRangeReset();
+                    return;
+                }}
+                const r = e['xaxis.range'] || [e['xaxis.range[0]'], e['xaxis.range[1]']];
+                const x0 = parseFloat(r[0]), x1 = parseFloat(r[1]);
+                if (!Number.isNaN(x0) && !Number.isNaN(x1))
+                    window.qt_bridge.emitXRangeChanged(x0, x1);
+                }});
+
                 plot.on('plotly_selected', (e) => {{
                 if (!window.qt_bridge || !e?.range?.x) return;
                 const [x0, x1] = e.range.x.map(parseFloat);
@@ -229,6 +328,37 @@ class _PlotlyCanvas:
             }}
             }};
 
+            // Incremental update: new points appended to traces, data of
+            // traces replaced and only the layout keys that changed
+            window.updateFigure = function(updJSON) {{
+            try {{
+                const upd = JSON.parse(updJSON);
+                const plot = document.getElementById('plot');
+                let p = Promise.resolve();
+
+                (upd.restyle || []).forEach((r) => {{
+                const x = decodeArray(r.x), y = decodeArray(r.y);
+                p = p.then(() => Plotly.restyle(plot, {{x: [x], y: [y]}}, [r.index]));
+                }});
+
+                if (upd.extend && upd.extend.indices.length) {{
+                const x = upd.extend.x.map(decodeArray), y = upd.extend.y.map(decodeArray);
+                p = p.then(() => Plotly.extendTraces(plot, {{x: x, y: y}}, upd.extend.indices));
+                }}
+
+                if (upd.relayout && Object.keys(upd.relayout).length) {{
+                p = p.then(() => {{
+                    window.py_relayout = true;
+                    return Plotly.relayout(plot, upd.relayout);
+                }}).finally(() => {{ window.py_relayout = false; }});
+                }}
+
+                p.catch((err) => console.error('updateFigure error:', err));
+            }} catch (err) {{
+                console.error('updateFigure error:', err);
+            }}
+            }};
+
             window.qt_ready = false;  // new global flag
             new QWebChannel(qt.webChannelTransport, (channel) => {{
                 window.qt_bridge = channel.objects.qt_bridge || null;
@@ -258,8 +388,11 @@ class _PlotlyCanvas:
     def remove_annotations_with_meta(self, meta_id: str):
         self._annotations = [a for a in self._annotations if a.get("meta") != meta_id]
 
-    # ---- Push a figure into the page ----
-    def render(self, fig, config=None):
+    def is_idle(self):
+        """True if the page shows the last figure rendered (it can be updated incrementally)"""
+        return self._ready and self._js_ready and self._pending is None
+
+    def merge_decorations(self, fig):
         # merge any queued shapes/annotations
         clean_shapes = [{k: v for k, v in s.items() if k != "meta"} for s in self._shapes]
         clean_ann    = [{k: v for k, v in a.items() if k != "meta"} for a in self._annotations]
@@ -274,7 +407,12 @@ class _PlotlyCanvas:
         else:
             fig.layout.annotations = ()
 
-        figJSON = fig.to_json()
+    # ---- Push a figure into the page ----
+    def render(self, fig, config=None, arrays=None):
+        """ arrays: (x, y) data of the first traces in fig, sent with the current transport """
+        self.merge_decorations(fig)
+
+        figJSON = self.figure_json(fig, arrays)
         cfgJSON = json.dumps(config if config is not None else self._config)
 
         # store latest payload; flush only when both page and JS are ready
@@ -294,6 +432,29 @@ class _PlotlyCanvas:
         self._warned_not_ready = False
         self._flush_if_ready()
 
+    def figure_json(self, fig, arrays=None):
+        if not arrays:
+            return fig.to_json()
+
+        figdict = fig.to_plotly_json()
+        for trace, (x, y) in zip(figdict["data"], arrays):
+            trace["x"] = _encode_array(x, self.transport)
+            trace["y"] = _encode_array(y, self.transport)
+
+        return json.dumps(figdict, cls=PlotlyJSONEncoder)
+
+    def update(self, extend=None, restyle=None, relayout=None):
+        """Sends an incremental update. Only valid if is_idle()"""
+        restyle = [dict(r, x=_encode_array(r["x"], self.transport), 
+                           y=_encode_array(r["y"], self.transport)) for r in restyle or []]
+        if extend:
+            extend = dict(extend, x=[_encode_array(x, self.transport) for x in extend["x"]],
+                                  y=[_encode_array(y, self.transport) for y in extend["y"]])
+
+        updJSON = json.dumps(dict(extend=extend, restyle=restyle, relayout=relayout or {}),
+                             cls=PlotlyJSONEncoder)
+        self.web.page().runJavaScript(f"window.updateFigure({json.dumps(updJSON)})")
+
 
 # ------------------------- Curve (trace) wrapper -------------------------
 
@@ -341,20 +502,28 @@ class SpecPlotCurvePlotly(SpecPlotCurve):
         else:
             return (None, None, None, None), None, self.yaxis
 
-    # Convert this curve to a Plotly trace dict
-    def to_trace(self):
-        if not (self._x.any() and self._y.size):
-            return None
+    def hasData(self):
+        return bool(self._x.any() and self._y.size)
+
+    def use_webgl(self):
+        """Curves drawn with more points than the plot webglpoints option use WebGL"""
+        plot = self._plot_ref()
+        threshold = getattr(plot, "webglpoints", None)
+        if threshold is None:
+            return False
 
-        y = self._y
+        index = self.getPlotIndex()
+        npts = len(self._x) if index is None else len(index)
+        return npts > threshold
 
+    # Trace properties other than data. A change here needs a full render
+    def trace_style(self):
         yaxis_name = "y" if self.yaxis == Y1_AXIS else "y2"
         mode = "lines+markers" if (self.uselines and self.usedots) else \
             ("lines" if self.uselines else "markers")
 
-        trace = go.Scatter(
-            x=self._x.tolist(),
-            y=y.tolist(),
+        style = dict(
+            type="scattergl" if self.use_webgl() else "scatter",
             name=self.mne,
             mode=mode,
             yaxis=yaxis_name,
@@ -362,12 +531,12 @@ class SpecPlotCurvePlotly(SpecPlotCurve):
             line=dict(width=self.linethick),
         )
         if self.color is not None:
-            trace.marker.color = str(self.color)
-            trace.line.color = str(self.color)
+            style['marker']['color'] = str(self.color)
+            style['line']['color'] = str(self.color)
 
         if self.selected:
-            trace.update(legendrank=0)
-        return trace
+            style['legendrank'] = 0
+        return style
 
 
 
@@ -566,6 +735,12 @@ class SpecPlotPlotly(QWidget, SpecPlotBaseClass):
         self.live_tint  = True        # tint background while scanning
         self._last_fit = {}  
 
+        # x range zoomed in the page (None if autoscaled)
+        self._view_xrange = None
+
+        # what the page shows (for incremental updates)
+        self._shown = None
+
         # axis/data bounds cache
         self.x_min = self.x_max = None
         self.y1_min = self.y1_max = None
@@ -606,10 +781,12 @@ class SpecPlotPlotly(QWidget, SpecPlotBaseClass):
 
         # Canvas (Plotly scene manager)
         self._canvas = _PlotlyCanvas(self._web, self._bridge)
+        self._canvas.transport = Preferences().getValue("plotly_transport", "binary")
 
         # Signals to outside
         self._bridge.pointSelected.connect(self._emit_point_selected)
         self._bridge.regionSelected.connect(self._emit_region_selected)
+        self._bridge.xRangeChanged.connect(self._xRangeChanged)
 
         self._layout.addWidget(self._web, 0, 0)
 
@@ -697,6 +874,14 @@ class SpecPlotPlotly(QWidget, SpecPlotBaseClass):
                 pass
             self.lineMotVal = t
 
+    def _xRangeChanged(self, xrange):
+        self._view_xrange = xrange
+
+    def getXViewRange(self):
+        if not self.axes_auto.get(X_AXIS, True) and X_AXIS in self.axes_limits:
+            return self.axes_limits[X_AXIS]
+        return self._view_xrange
+
     # ------------- Bridge re-emission -------------
     def _emit_point_selected(self, xlabel: str, xpos: float):
         # xlabel should be self.first_x to match your API
@@ -1032,24 +1217,10 @@ class SpecPlotPlotly(QWidget, SpecPlotBaseClass):
 
     # ---- Main render/update ----
     def replot(self):
-        traces = []
-        for c in self.curves.values():
-            if not c.isAttached():
-                continue
-            tr = c.to_trace()
-            if tr:
-                traces.append(tr)
-
-        # If there are no curves yet, add an invisible trace so axes appear
-        if not traces:
-            traces = [go.Scatter(
-                x=[0, 1], y=[0, 1], mode="lines",
-                line=dict(width=0), showlegend=False, hoverinfo="skip", name=""
-            )]
-        if self._overlays:
-            traces.extend(self._overlays)
+        curves = [c for c in self.curves.values() if c.isAttached() and c.hasData()]
 
-        fig = go.Figure(data=traces)
+        # traces are added when rendering
+        fig = go.Figure()
 
 
         # 2) layout: axes, labels, scales, legend, grid
@@ -1144,6 +1315,9 @@ class SpecPlotPlotly(QWidget, SpecPlotBaseClass):
         # X
         if not self.axes_auto.get(X_AXIS, True) and X_AXIS in self.axes_limits:
             xmin, xmax = self.axes_limits[X_AXIS]
+        elif self._view_xrange is not None:
+            # keep the range zoomed in the page. curves are decimated for it
+            xmin, xmax = self._view_xrange
         else:
             xmin, xmax = self.x_min, self.x_max
         if None not in (xmin, xmax):
@@ -1231,11 +1405,80 @@ class SpecPlotPlotly(QWidget, SpecPlotBaseClass):
 
 
         # 5) render
-        self._canvas.render(fig)
+        self._render(fig, curves)
         # notify
         self.configurationChanged.emit()
     
 
+    def _render(self, fig, curves):
+        """
+        Sends the figure to the page. A full render (Plotly.react) is only done 
+        when traces, axes or theme changed. Otherwise the points added to the 
+        curves are appended with extendTraces, the data of curves that changed
+        otherwise is replaced with restyle and only the layout keys that changed
+        are sent with relayout.
+        """
+        structure = json.dumps([[c.trace_style() for c in curves],
+                                [tr.to_plotly_json() for tr in self._overlays],
+                                str(self.theme), self.xlog, self.y1log, self.y2log,
+                                self.using_y1, self.using_y2],
+                               cls=PlotlyJSONEncoder, sort_keys=True)
+
+        self._canvas.merge_decorations(fig)
+        layout = _flatten_layout(fig.layout.to_plotly_json())
+
+        plotdata = [c.getPlotData() for c in curves]
+
+        shown = self._shown
+
+        if shown is None or shown['structure'] != structure or not self._canvas.is_idle():
+            sent = [_sent_info(x, y) for x, y in plotdata]
+            self._shown = dict(structure=structure, layout=layout, sent=sent)
+
+            # data is added when the figure is serialized
+            traces = [_make_trace(c.trace_style()) for c in curves]
+
+            # If there are no curves yet, add an invisible trace so axes appear
+            if not traces:
+                traces = [go.Scatter(
+                    x=[0, 1], y=[0, 1], mode="lines",
+                    line=dict(width=0), showlegend=False, hoverinfo="skip", name=""
+                )]
+            if self._overlays:
+                traces.extend(self._overlays)
+
+            fig.add_traces(traces)
+            self._canvas.render(fig, arrays=plotdata)
+            return
+
+        extend = dict(x=[], y=[], indices=[])
+        restyle = []
+        sent = []
+
+        # points already on the page (same checksum) are not sent again
+        for idx, ((x, y), before) in enumerate(zip(plotdata, shown['sent'])):
+            npts = before[0]
+            if npts and len(x) >= npts and _sent_info(x[:npts], y[:npts]) == before:
+                if len(x) > npts:
+                    extend['x'].append(x[npts:])
+                    extend['y'].append(y[npts:])
+                    extend['indices'].append(idx)
+                sent.append(_extended_info(before, x[npts:], y[npts:]))
+            else:
+                restyle.append(dict(index=idx, x=x, y=y))
+                sent.append(_sent_info(x, y))
+
+        self._shown = dict(structure=structure, layout=layout, sent=sent)
+
+        relayout = {key: value for key, value in layout.items()
+                    if shown['layout'].get(key, _MISSING) != value}
+        for key in shown['layout']:
+            if key not in layout:
+                relayout[key] = None
+
+        if extend['indices'] or restyle or relayout:
+            self._canvas.update(extend, restyle, relayout)
+
     def queue_replot(self):
         """Coalesce rapid replot calls (~10 Hz max)."""
         if getattr(self, "_replot_pending", False):
@@ -1392,10 +1635,9 @@ class SpecPlotPlotly(QWidget, SpecPlotBaseClass):
 
         traces = []
         for c in self.curves.values():
-            if c.isAttached():
-                tr = c.to_trace()
-                if tr:
-                    traces.append(tr)
+            if c.isAttached() and c.hasData():
+                # all the points, not the decimated ones
+                traces.append(_make_trace(c.trace_style(), x=c._x.tolist(), y=c._y.tolist()))
         if self._overlays:
             traces.extend(self._overlays)
         if not traces:
@@ -1473,5 +1715,41 @@ def _demo():
     win.show()
     sys.exit(app.exec())
 
+def benchmark_transport(npts=100000, repeat=5):
+    """
+    Compares the curve data transports: payload size, time to build the payload
+    and time to decode it (json.loads, and base64 for binary transports, as an
+    estimate of the work left to the page).
+    """
+    x = np.arange(npts, dtype=float) * 0.001
+    y = np.random.normal(size=npts).cumsum()
+
+    fig = go.Figure(go.Scatter(mode="lines"))
+
+    for transport in ("json", "binary", "binary32"):
+        figdict = fig.to_plotly_json()
+
+        t0 = time.time()
+        for _ in range(repeat):
+            trace = figdict["data"][0]
+            trace["x"] = _encode_array(x, transport)
+            trace["y"] = _encode_array(y, transport)
+            payload = json.dumps(figdict, cls=PlotlyJSONEncoder)
+        t1 = time.time()
+        for _ in range(repeat):
+            trace = json.loads(payload)["data"][0]
+            for values in (trace["x"], trace["y"]):
+                if isinstance(values, dict):
+                    np.frombuffer(base64.b64decode(values["bdata"]), dtype="<" + values["dtype"])
+        t2 = time.time()
+
+        print("%-9s %7d points: %9d bytes  encode %6.1f ms  decode %6.1f ms" % (
+            transport, npts, len(payload), (t1 - t0) / repeat * 1000, (t2 - t1) / repeat * 1000))
+
+
 if __name__ == "__main__":
-    _demo()
+    import sys
+    if "--benchmark" in sys.argv:
+        benchmark_transport()
+    else:
+        _demo()
@@ -138,7 +138,11 @@ class SpecPlotCurveQwt(Qwt.QwtPlotCurve, SpecPlotCurve):
 
     def setData(self, xdata, ydata):
         SpecPlotCurve.setData(self, xdata, ydata)
-        Qwt.QwtPlotCurve.setData(self, self._x, self._y)
+        Qwt.QwtPlotCurve.setData(self, *self.getPlotData())
+
+    def setPlotIndex(self, index, key):
+        SpecPlotCurve.setPlotIndex(self, index, key)
+        Qwt.QwtPlotCurve.setData(self, *self.getPlotData())
 
     def boundingRect(self):
         """Return the bounding rectangle of the data, error bars included.
@@ -163,15 +167,19 @@ class SpecPlotCurveQwt(Qwt.QwtPlotCurve, SpecPlotCurve):
     def drawSegments(self, painter, xmap, ymap, segments):
         lines = []
 
+        # points drawn may be a decimated subset of the data
+        index = self.getPlotIndex()
+
         for beg, end in segments:
            # prepare lines
             if self.showbars and self._dy.any():
                 # draw the bars
                 i = beg
                 while i < end:
-                    xi = xmap.transform(self._x[i])
+                    j = i if index is None else index[i]
+                    xi = xmap.transform(self._x[j])
                     line = QLine(xi, ymap.transform(
-                        self._ymin[i]), xi, ymap.transform(self._ymax[i]))
+                        self._ymin[j]), xi, ymap.transform(self._ymax[j]))
                     lines.append(line)
                     i += 1
 
@@ -711,6 +719,15 @@ class SpecPlotQwt(Qwt.QwtPlot, SpecPlotBaseClass):
         low = ival.minValue()
         return low, high
 
+    def getXViewRange(self):
+        if self.zoomer is None or self.zoomer.zoomRectIndex() == 0:
+            return None
+        ival = self.axisScaleDiv(Qwt.QwtPlot.xBottom).interval()
+        return ival.minValue(), ival.maxValue()
+
+    def getViewWidth(self):
+        return self.canvas().width()
+
     def findMinMax(self, cols):
 
         colmin = None